@@ -0,0 +1,188 @@
+"""Banco de pruebas en proceso, endpoint a endpoint.
+
+Arranca la aplicación dentro del propio proceso (TestClient de FastAPI, sin
+red ni uvicorn) sobre un conjunto de datos de bench/generar_datos.py y lanza
+contra cada endpoint una tanda de peticiones concurrentes. Muestra el caudal
+(op/s) y la latencia p50/p95/p99 de cada uno, y el tiempo de arranque:
+
+    python bench/generar_datos.py --duenos 100k --destino /tmp/clinica_100k
+    python bench/carga_endpoints.py --datos /tmp/clinica_100k --json antes.json
+
+Con --sql se prueba el backend SQL (CLINICA_ALMACENAMIENTO=sql) sobre la base
+cargada con generar_datos.py --sql. Las altas se escriben en los datos de
+--datos (o en la base): continúan la numeración del generador, de modo que el
+conjunto sigue siendo válido para la siguiente ejecución. Con --solo-lecturas
+no se modifica nada.
+
+Cliente y servidor comparten proceso (y GIL): los números sirven para comparar
+versiones entre sí, no como latencia absoluta de producción.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import count
+
+from generar_datos import CONSULTAS, ESPECIES, INICIO, NOMBRES, TRATAMIENTOS, chip, dni, hora_laboral, nombre_dueno
+from informe import guardar, imprimir, resumen
+
+FASTAPI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def arrancar(datos: str, sql: str = None):
+    # El servidor abre sus CSV en el directorio actual y elige el backend al
+    # importarse: el entorno tiene que estar listo antes del import
+    if sql:
+        os.environ["CLINICA_ALMACENAMIENTO"] = "sql"
+        os.environ["DATABASE_URL"] = sql
+    os.chdir(datos)
+    sys.path.insert(0, FASTAPI)
+    from fastapi.testclient import TestClient
+    import server
+
+    return TestClient(server.app)
+
+
+class Endpoints:
+    """Peticiones de cada endpoint sobre claves que existen en los datos."""
+
+    def __init__(self, cliente, semilla: int = 1):
+        self.cliente = cliente
+        self.aleatorio = random.Random(semilla)
+        self.duenos = int(cliente.get("/duenos/", params={"limit": 1}).headers["X-Total-Count"])
+        self.animales = int(cliente.get("/animales/", params={"limit": 1}).headers["X-Total-Count"])
+        # Una cita por dueño generado, 18 huecos por día y consulta, 5 días por semana
+        self.semanas = max(1, self.duenos // (18 * 5 * len(CONSULTAS)))
+        self._nuevos_duenos = count(self.duenos)
+        self._nuevos_animales = count(self.animales)
+        self._lock = threading.Lock()
+
+    def _azar(self, funcion, *args):
+        with self._lock:
+            return funcion(*args)
+
+    def _dni(self):
+        return dni(self._azar(self.aleatorio.randrange, self.duenos))
+
+    def lecturas(self) -> dict:
+        # nombre -> función que hace una petición y devuelve la respuesta
+        get = self.cliente.get
+
+        def facturas_de_un_mes():
+            desde = INICIO + timedelta(days=self._azar(self.aleatorio.randrange, 700))
+            return get("/facturas/", params={"desde": desde.date().isoformat(),
+                                             "hasta": (desde + timedelta(days=30)).date().isoformat(),
+                                             "limit": 100})
+
+        def citas_de_una_semana():
+            desde = INICIO + timedelta(weeks=self._azar(self.aleatorio.randrange, self.semanas))
+            return get("/citas/", params={"desde": desde.isoformat(),
+                                          "hasta": (desde + timedelta(days=7)).isoformat()})
+
+        def disponibilidad():
+            inicio = hora_laboral(self._azar(self.aleatorio.randrange, self.semanas * 90))
+            return get("/citas/disponibilidad", params={"inicio": inicio.isoformat(),
+                                                        "fin": (inicio + timedelta(minutes=30)).isoformat()})
+
+        return {
+            "GET /duenos/{dni}": lambda: get(f"/duenos/{self._dni()}"),
+            "GET /duenos/{dni}/expediente": lambda: get(f"/duenos/{self._dni()}/expediente"),
+            "GET /animales/{chip}": lambda: get(
+                f"/animales/{chip(self._azar(self.aleatorio.randrange, self.animales))}"),
+            "GET /duenos/ (página)": lambda: get("/duenos/", params={
+                "limit": 50, "offset": self._azar(self.aleatorio.randrange, self.duenos)}),
+            "GET /animales/ (especie)": lambda: get("/animales/", params={
+                "especie_animal": self._azar(self.aleatorio.choice, ESPECIES), "limit": 50}),
+            "GET /facturas/ (un mes)": facturas_de_un_mes,
+            "GET /citas/ (una semana)": citas_de_una_semana,
+            "GET /citas/disponibilidad": disponibilidad,
+            "GET /stats/": lambda: get("/stats/"),
+            "GET /facturacion_total/": lambda: get("/facturacion_total/", params={"desglose": True}),
+        }
+
+    def escrituras(self) -> dict:
+        post = self.cliente.post
+
+        def alta_dueno():
+            i = next(self._nuevos_duenos)
+            return post("/alta_duenos/", json={
+                "nombre_dueno": nombre_dueno(i), "telefono_dueno": str(600000000 + i),
+                "email_dueno": f"dueno{i}@example.com", "dni_dueno": dni(i),
+                "direccion_dueno": "Calle Mayor 1"})
+
+        def alta_animal():
+            return post("/alta_animal/", json={
+                "nombre_animal": self._azar(self.aleatorio.choice, NOMBRES),
+                "chip_animal": chip(next(self._nuevos_animales)),
+                "especie_animal": self._azar(self.aleatorio.choice, ESPECIES),
+                "nacimiento_animal": "2020-01-01", "sexo": "Hembra", "dni_dueno": self._dni()})
+
+        def alta_factura():
+            tratamiento = self._azar(self.aleatorio.choice, list(TRATAMIENTOS))
+            return post("/alta_factura/", json={
+                "nombre_dueno": nombre_dueno(self._azar(self.aleatorio.randrange, self.duenos)),
+                "nombre_animal": self._azar(self.aleatorio.choice, NOMBRES), "tratamiento": tratamiento,
+                "importe_con_iva": round(TRATAMIENTOS[tratamiento] * 1.21 + 10, 2),
+                "fecha": INICIO.isoformat()})
+
+        return {
+            "POST /alta_duenos/": alta_dueno,
+            "POST /alta_animal/": alta_animal,
+            "POST /alta_factura/": alta_factura,
+        }
+
+
+def medir(funcion, peticiones: int, clientes: int):
+    def una(_):
+        inicio = time.perf_counter()
+        respuesta = funcion()
+        return time.perf_counter() - inicio, respuesta.status_code
+
+    funcion()  # calentamiento, fuera de la medida
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(clientes) as pool:
+        resultados = list(pool.map(una, range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    return resumen([t for t, _ in resultados], duracion, sum(codigo >= 400 for _, codigo in resultados))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datos", required=True, help="directorio generado con generar_datos.py")
+    parser.add_argument("--sql", help="URL de la base de datos (backend SQL)")
+    parser.add_argument("--peticiones", type=int, default=500, help="peticiones por endpoint")
+    parser.add_argument("--clientes", type=int, default=8, help="peticiones concurrentes")
+    parser.add_argument("--solo", help="solo los endpoints cuyo nombre contenga este texto")
+    parser.add_argument("--solo-lecturas", action="store_true", help="no medir las altas")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", help="guardar los resultados en este fichero")
+    args = parser.parse_args()
+    salida = os.path.abspath(args.json) if args.json else None
+
+    inicio = time.perf_counter()
+    with arrancar(os.path.abspath(args.datos), args.sql) as cliente:
+        arranque = time.perf_counter() - inicio
+        endpoints = Endpoints(cliente, args.semilla)
+        print(f"Arranque {arranque:.2f} s; {endpoints.duenos} dueños, {endpoints.animales} animales; "
+              f"{args.peticiones} peticiones por endpoint, {args.clientes} clientes")
+        operaciones = endpoints.lecturas()
+        if not args.solo_lecturas:
+            operaciones.update(endpoints.escrituras())
+        resumenes = {nombre: medir(funcion, args.peticiones, args.clientes)
+                     for nombre, funcion in operaciones.items()
+                     if args.solo is None or args.solo in nombre}
+    imprimir(resumenes)
+
+    if salida:
+        guardar(salida, {"datos": args.datos, "almacenamiento": "sql" if args.sql else "csv",
+                         "duenos": endpoints.duenos, "animales": endpoints.animales,
+                         "peticiones": args.peticiones, "clientes": args.clientes,
+                         "arranque_s": round(arranque, 2), "endpoints": resumenes})
+
+
+if __name__ == "__main__":
+    main()
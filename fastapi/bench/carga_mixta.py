@@ -0,0 +1,136 @@
+"""Carga mixta de lecturas y escrituras contra un servidor en marcha.
+
+Lanza varios clientes concurrentes que buscan dueños y animales por clave y
+dan de alta otros nuevos, y muestra la latencia (p50/p95/p99) de cada
+operación. Sirve para comparar versiones del servidor con la misma carga:
+
+    uvicorn server:app --port 8000
+    python bench/carga_mixta.py --url http://localhost:8000 --clientes 32
+
+Con --facturas una parte de las operaciones son altas de facturas (que
+esperan a su escritura agrupada) y listados de dueños (endpoint síncrono).
+
+Solo usa la biblioteca estándar.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from informe import imprimir, resumen
+
+
+def peticion(url, metodo="GET", cuerpo=None):
+    datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else None
+    req = urllib.request.Request(url, data=datos, method=metodo,
+                                 headers={"Content-Type": "application/json"})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as respuesta:
+            respuesta.read()
+            codigo = respuesta.status
+    except urllib.error.HTTPError as e:
+        codigo = e.code
+    return time.perf_counter() - inicio, codigo
+
+
+def nuevo_dueno():
+    dni = f"B{uuid.uuid4().hex[:8].upper()}"
+    return {"nombre_dueno": f"Dueño {dni}", "telefono_dueno": 600000000,
+            "email_dueno": f"{dni.lower()}@example.com", "dni_dueno": dni,
+            "direccion_dueno": "Calle Mayor 1"}
+
+
+def nueva_factura(dni):
+    return {"nombre_dueno": f"Dueño {dni}", "nombre_animal": "Toby", "tratamiento": "Vacunación",
+            "importe_con_iva": 28.15, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def nuevo_animal(dni):
+    return {"nombre_animal": "Toby", "chip_animal": str(random.randint(10**11, 10**12 - 1)),
+            "especie_animal": random.choice(["Perro", "Gato"]),
+            "nacimiento_animal": "2020-01-01", "sexo": "M", "dni_dueno": dni}
+
+
+class Carga:
+    def __init__(self, url, escrituras, facturas=0.0):
+        self.url = url.rstrip("/")
+        self.escrituras = escrituras
+        self.facturas = facturas
+        self.duenos = []
+        self.chips = []
+        self.tiempos = {}
+        self.errores = {}
+        self._lock = threading.Lock()
+
+    def preparar(self, n):
+        for _ in range(n):
+            self.alta_dueno()
+
+    def alta_dueno(self):
+        dueno = nuevo_dueno()
+        tiempo, codigo = peticion(f"{self.url}/alta_duenos/", "POST", dueno)
+        animal = nuevo_animal(dueno["dni_dueno"])
+        tiempo_animal, codigo_animal = peticion(f"{self.url}/alta_animal/", "POST", animal)
+        with self._lock:
+            self.duenos.append(dueno["dni_dueno"])
+            self.chips.append(animal["chip_animal"])
+        return [("POST /alta_duenos/", tiempo, codigo), ("POST /alta_animal/", tiempo_animal, codigo_animal)]
+
+    def operacion(self, _):
+        with self._lock:
+            dni = random.choice(self.duenos)
+            chip = random.choice(self.chips)
+        if random.random() < self.facturas:
+            if random.random() < 0.5:
+                return [("POST /alta_factura/",) + peticion(f"{self.url}/alta_factura/", "POST", nueva_factura(dni))]
+            offset = random.randrange(len(self.duenos))
+            return [("GET /duenos/ (página)",) + peticion(f"{self.url}/duenos/?limit=20&offset={offset}")]
+        if random.random() < self.escrituras:
+            return self.alta_dueno()
+        if random.random() < 0.5:
+            return [("GET /duenos/{dni}",) + peticion(f"{self.url}/duenos/{dni}")]
+        return [("GET /animales/{chip}",) + peticion(f"{self.url}/animales/{chip}")]
+
+    def registrar(self, resultados):
+        for nombre, tiempo, codigo in resultados:
+            self.tiempos.setdefault(nombre, []).append(tiempo)
+            self.errores[nombre] = self.errores.get(nombre, 0) + (codigo >= 400)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clientes", type=int, default=32, help="peticiones concurrentes")
+    parser.add_argument("--peticiones", type=int, default=2000, help="operaciones en total")
+    parser.add_argument("--escrituras", type=float, default=0.3, help="fracción de altas (0-1)")
+    parser.add_argument("--facturas", type=float, default=0.0,
+                        help="fracción de altas de facturas y listados de dueños (0-1)")
+    parser.add_argument("--precarga", type=int, default=200, help="dueños creados antes de medir")
+    args = parser.parse_args()
+
+    carga = Carga(args.url, args.escrituras, args.facturas)
+    carga.preparar(args.precarga)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.clientes) as pool:
+        for resultados in pool.map(carga.operacion, range(args.peticiones)):
+            carga.registrar(resultados)
+    duracion = time.perf_counter() - inicio
+
+    print(f"{args.peticiones} operaciones, {args.clientes} clientes, {duracion:.2f} s "
+          f"({args.peticiones / duracion:.0f} op/s), {sum(carga.errores.values())} errores")
+    resumenes = {nombre: resumen(tiempos, errores=carga.errores[nombre])
+                 for nombre, tiempos in sorted(carga.tiempos.items())}
+    resumenes["total"] = resumen([t for tiempos in carga.tiempos.values() for t in tiempos], duracion,
+                                 sum(carga.errores.values()))
+    imprimir(resumenes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Genera un conjunto de datos sintético de la clínica a escala.
+
+Escribe registroDuenos.csv, registroAnimales.csv, registroFacturas.csv,
+registroCitas.csv y registroTratamientos.csv con el mismo formato que el
+backend CSV, y opcionalmente los carga en una base de datos con
+data/setup_db.py para probar el backend SQL:
+
+    python bench/generar_datos.py --duenos 100k --destino /tmp/clinica_100k
+    python bench/generar_datos.py --duenos 1M --destino /tmp/clinica_1m --sql sqlite:////tmp/clinica_1m/clinica.db
+
+Por cada dueño hay de media 1,5 animales, 3 facturas y 1 cita. La misma
+semilla produce siempre los mismos datos.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ESPECIES = ["Perro", "Gato", "Conejo", "Hurón", "Loro", "Tortuga"]
+NOMBRES = ["Toby", "Luna", "Coco", "Nala", "Rocky", "Kira", "Simba", "Lola", "Max", "Bimba"]
+TRATAMIENTOS = {
+    "Análisis": 15, "Vacunación": 15, "Desparasitación": 25, "Revisión general": 30,
+    "Revisión cardiología": 55, "Revisión cutánea": 45, "Ecografías": 50, "Cirugía": 250,
+}
+CONSULTAS = ["A", "B"]
+INICIO = datetime(2023, 1, 2, 9, 0)
+IVA = 0.21
+
+COLUMNAS = {
+    "registroDuenos.csv": ["nombre_dueno", "telefono_dueno", "email_dueno", "dni_dueno", "direccion_dueno"],
+    "registroAnimales.csv": ["nombre_animal", "chip_animal", "especie_animal", "nacimiento_animal",
+                             "sexo", "fecha_alta", "dni_dueno"],
+    "registroFacturas.csv": ["id", "nombre_dueno", "nombre_animal", "tratamiento", "importe_con_iva", "fecha"],
+    "registroCitas.csv": ["id", "nombre_animal", "nombre_dueno", "tratamiento", "fecha_inicio",
+                          "fecha_fin", "consulta"],
+    "registroTratamientos.csv": ["id", "nombre_tratamiento", "importe_con_iva", "fecha"],
+}
+
+
+def dni(i: int) -> str:
+    return f"{i:08d}{'TRWAGMYFPDXBNJZSQVHLCKE'[i % 23]}"
+
+
+def chip(i: int) -> str:
+    return f"{724000000000000 + i}"
+
+
+def nombre_dueno(i: int) -> str:
+    return f"Dueño {i}"
+
+
+def a_numero(texto: str) -> int:
+    # "100k" -> 100000, "1M" -> 1000000
+    multiplicador = {"k": 1_000, "m": 1_000_000}.get(texto[-1].lower(), 1)
+    return int(float(texto.rstrip("kKmM")) * multiplicador)
+
+
+def hora_laboral(n: int) -> datetime:
+    # n-ésimo hueco de 30 minutos en horario de 9 a 18, de lunes a viernes
+    dia, hueco = divmod(n, 18)
+    semana, dia = divmod(dia, 5)
+    return INICIO + timedelta(weeks=semana, days=dia, minutes=30 * hueco)
+
+
+def generar(destino: str, duenos: int, semilla: int = 1) -> dict:
+    aleatorio = random.Random(semilla)
+    os.makedirs(destino, exist_ok=True)
+    ficheros = {nombre: open(os.path.join(destino, nombre), "w", newline="", encoding="utf-8")
+                for nombre in COLUMNAS}
+    escritores = {nombre: csv.writer(f) for nombre, f in ficheros.items()}
+    for nombre, columnas in COLUMNAS.items():
+        escritores[nombre].writerow(columnas)
+    # Las bajas antiguas no aplican a los datos nuevos
+    for nombre in COLUMNAS:
+        for sufijo in (".bajas", ".lock"):
+            if os.path.exists(os.path.join(destino, nombre + sufijo)):
+                os.remove(os.path.join(destino, nombre + sufijo))
+
+    animales = 0
+    facturas = 0
+    citas = 0
+    dias = 365 * 2
+    for i in range(duenos):
+        escritores["registroDuenos.csv"].writerow(
+            [nombre_dueno(i), 600000000 + i, f"dueno{i}@example.com", dni(i), f"Calle Mayor {i % 300 + 1}"])
+        mascotas = []
+        for _ in range(aleatorio.choice((1, 1, 2, 2))):
+            nombre = aleatorio.choice(NOMBRES)
+            alta = INICIO + timedelta(days=aleatorio.randrange(dias), minutes=aleatorio.randrange(600))
+            escritores["registroAnimales.csv"].writerow(
+                [nombre, chip(animales), aleatorio.choice(ESPECIES),
+                 f"{aleatorio.randrange(2005, 2023)}-{aleatorio.randrange(1, 13):02d}-{aleatorio.randrange(1, 29):02d}",
+                 aleatorio.choice(("Macho", "Hembra")), alta, dni(i)])
+            mascotas.append(nombre)
+            animales += 1
+        for _ in range(aleatorio.choice((2, 3, 4))):
+            tratamiento = aleatorio.choice(list(TRATAMIENTOS))
+            facturas += 1
+            fecha = INICIO + timedelta(days=aleatorio.randrange(dias), minutes=aleatorio.randrange(600))
+            escritores["registroFacturas.csv"].writerow(
+                [facturas, nombre_dueno(i), aleatorio.choice(mascotas), tratamiento,
+                 round(TRATAMIENTOS[tratamiento] * (1 + IVA) + 10, 2), fecha])
+        # Citas sin solapes: huecos consecutivos repartidos entre las consultas
+        citas += 1
+        inicio = hora_laboral((citas - 1) // len(CONSULTAS))
+        escritores["registroCitas.csv"].writerow(
+            [citas, aleatorio.choice(mascotas), nombre_dueno(i), aleatorio.choice(list(TRATAMIENTOS)),
+             inicio, inicio + timedelta(minutes=30), CONSULTAS[(citas - 1) % len(CONSULTAS)]])
+    for n, (tratamiento, precio) in enumerate(TRATAMIENTOS.items(), start=1):
+        escritores["registroTratamientos.csv"].writerow([n, tratamiento, round(precio * (1 + IVA), 2), INICIO])
+    for f in ficheros.values():
+        f.close()
+
+    return {"registroDuenos.csv": duenos, "registroAnimales.csv": animales,
+            "registroFacturas.csv": facturas, "registroCitas.csv": citas,
+            "registroTratamientos.csv": len(TRATAMIENTOS)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duenos", default="1k", help="número de dueños: 1k, 100k, 1M o un entero")
+    parser.add_argument("--destino", required=True, help="directorio donde escribir los CSV")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--sql", help="URL de base de datos donde cargar también los datos")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    totales = generar(args.destino, a_numero(args.duenos), args.semilla)
+    for nombre, total in totales.items():
+        print(f"{nombre:<26}{total:>10} filas")
+    print(f"CSV generados en {time.perf_counter() - inicio:.1f} s")
+
+    if args.sql:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+        from data.setup_db import cargar
+
+        inicio = time.perf_counter()
+        cargar(args.sql, args.destino, reemplazar=True)
+        print(f"Cargados en {args.sql} en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Resumen de latencias común a los scripts de bench/."""
+import json
+import statistics
+
+
+def percentil(valores, p):
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1] if len(valores) > 1 else valores[0]
+
+
+def resumen(tiempos, duracion=None, errores=0) -> dict:
+    # tiempos en segundos; duracion: tiempo real de la tanda, para el caudal
+    return {
+        "n": len(tiempos),
+        "op_s": round(len(tiempos) / duracion, 1) if duracion else None,
+        "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+        "p95_ms": round(percentil(tiempos, 95) * 1000, 2),
+        "p99_ms": round(percentil(tiempos, 99) * 1000, 2),
+        "max_ms": round(max(tiempos) * 1000, 2),
+        "errores": errores,
+    }
+
+
+def imprimir(resumenes: dict):
+    ancho = max([22] + [len(nombre) + 2 for nombre in resumenes])
+    print(f"{'operación':<{ancho}}{'n':>7}{'op/s':>9}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'máx ms':>10}{'errores':>9}")
+    for nombre, r in resumenes.items():
+        caudal = f"{r['op_s']:.0f}" if r["op_s"] is not None else "-"
+        print(f"{nombre:<{ancho}}{r['n']:>7}{caudal:>9}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['errores']:>9}")
+
+
+def guardar(fichero: str, datos: dict):
+    # Resultados en JSON para comparar ejecuciones
+    with open(fichero, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,71 @@
+"""Coste de serializar y comprimir las respuestas de los listados.
+
+Para cada listado completo (dueños, animales, facturas y, si está su CSV,
+contratos) de un conjunto de bench/generar_datos.py compara:
+
+- CPU de serializar como antes (jsonable_encoder + json.dumps de
+  JSONResponse) y con orjson (RespuestaJSON, data/respuestas.py);
+- bytes en la red sin comprimir, con gzip y con brotli, y la CPU de comprimir.
+
+    python bench/serializacion.py --datos /tmp/clinica_100k
+"""
+import argparse
+import json
+import os
+import time
+
+from carga_endpoints import arrancar
+
+
+def cpu_ms(funcion, repeticiones: int) -> float:
+    # Mediana del tiempo de CPU de una llamada, en ms
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        funcion()
+        tiempos.append(time.process_time() - inicio)
+    return sorted(tiempos)[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datos", required=True, help="directorio generado con generar_datos.py")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    arrancar(os.path.abspath(args.datos))
+    import server
+    from fastapi.encoders import jsonable_encoder
+    from data import respuestas
+
+    def antes(filas):
+        return json.dumps(jsonable_encoder(filas), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    listados = {
+        "duenos": server.dueno_repository.find()[1],
+        "animales": server.animal_repository.find()[1],
+        "facturas": [server.importe_valido(f) for f in server.factura_repository.find()[1]],
+    }
+    try:
+        listados["contratos"] = json.loads(server.contratos.json())
+    except FileNotFoundError:
+        pass
+
+    codificaciones = {c.nombre: c for c in respuestas.CODIFICACIONES}
+    print(f"{'listado':<11}{'filas':>8}{'json ms':>9}{'orjson ms':>11}{'bytes':>10}"
+          + "".join(f"{nombre + ' bytes':>12}{nombre + ' ms':>9}" for nombre in codificaciones))
+    for nombre, filas in listados.items():
+        n = len(filas["contratos"]) if isinstance(filas, dict) else len(filas)
+        cuerpo = respuestas.dumps(filas)
+        linea = (f"{nombre:<11}{n:>8}{cpu_ms(lambda: antes(filas), args.repeticiones):>9.1f}"
+                 f"{cpu_ms(lambda: respuestas.dumps(filas), args.repeticiones):>11.1f}{len(cuerpo):>10}")
+        for codificacion in codificaciones.values():
+            comprimido = codificacion().fin(cuerpo)
+            ms = cpu_ms(lambda: codificacion().fin(cuerpo), args.repeticiones)
+            linea += f"{len(comprimido):>12}{ms:>9.1f}"
+        print(linea)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+
+
+# Índice de citas por consulta, ordenado por hora de inicio.
+# Para cada consulta se guarda una lista ordenada de (inicio, id) y la duración
+# más larga vista, de modo que las citas que se solapan con [desde, hasta) se
+# localizan con una búsqueda binaria desde `desde - duración máxima` en lugar
+# de recorrer todo el histórico.
+#
+# Se suscribe a un AppendOnlyCSV (reset/added/removed) para mantenerse
+# coherente con las altas, bajas y recargas del fichero de citas.
+class Agenda:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_consulta = {}  # consulta -> [(inicio, id)] ordenada
+        self._citas = {}         # id -> (consulta, inicio, fin)
+        self._duracion_max = {}  # consulta -> timedelta
+        self.ultimo_id = 0
+
+    # --- Suscriptor del almacén ---
+
+    def reset(self, rows):
+        with self._lock:
+            self._por_consulta = {}
+            self._citas = {}
+            self._duracion_max = {}
+            for row in rows:
+                self._add(row)
+
+    def added(self, row):
+        with self._lock:
+            self._add(row)
+
+    def removed(self, row):
+        with self._lock:
+            cita_id = int(row["id"])
+            consulta, inicio, fin = self._citas.pop(cita_id)
+            citas = self._por_consulta[consulta]
+            del citas[bisect.bisect_left(citas, (inicio, cita_id))]
+
+    # --- Consultas ---
+
+    def consultas(self) -> list:
+        with self._lock:
+            return list(self._por_consulta)
+
+    def solapadas(self, desde=None, hasta=None, consulta=None) -> list:
+        # Ids de las citas que se solapan con [desde, hasta), por hora de inicio
+        desde = a_fecha(desde) if desde is not None else None
+        hasta = a_fecha(hasta) if hasta is not None else None
+        with self._lock:
+            consultas = [consulta] if consulta is not None else list(self._por_consulta)
+            encontradas = []
+            for c in consultas:
+                citas = self._por_consulta.get(c)
+                if not citas:
+                    continue
+                inicio = 0
+                if desde is not None:
+                    inicio = bisect.bisect_left(citas, (desde - self._duracion_max[c],))
+                for i in range(inicio, len(citas)):
+                    comienzo, cita_id = citas[i]
+                    if hasta is not None and comienzo >= hasta:
+                        break
+                    if desde is None or self._citas[cita_id][2] > desde:
+                        encontradas.append((comienzo, cita_id))
+            return [cita_id for _, cita_id in sorted(encontradas)]
+
+    def _add(self, row):
+        cita_id = int(row["id"])
+        consulta = str(row["consulta"])
+        inicio = a_fecha(row["fecha_inicio"])
+        fin = a_fecha(row["fecha_fin"])
+        self._citas[cita_id] = (consulta, inicio, fin)
+        bisect.insort(self._por_consulta.setdefault(consulta, []), (inicio, cita_id))
+        self._duracion_max[consulta] = max(self._duracion_max.get(consulta, timedelta(0)), fin - inicio)
+        self.ultimo_id = max(self.ultimo_id, cita_id)
+
+
+def a_fecha(valor) -> datetime:
+    # Hora de pared sin zona: el calendario puede enviar el desfase horario
+    fecha = valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor))
+    return fecha.replace(tzinfo=None)
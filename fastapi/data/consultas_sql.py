@@ -0,0 +1,100 @@
+from sqlalchemy import Date, func
+from sqlalchemy.orm import selectinload
+
+from data import model
+from data.agenda import a_fecha
+
+
+# Consultas de los repositorios SQL del servidor (server.py). Están aquí, y no
+# en los repositorios, para que data/migrar_indices.py compruebe el plan de
+# estas mismas consultas sobre la base que migra sin importar el servidor.
+# Cada función recibe la sesión y devuelve la consulta (o su resultado).
+
+def filtrar(session, modelo, filtros=(), columna_fecha=None, desde=None, hasta=None):
+    # Filas de `modelo` con los filtros de igualdad [(columna, valor)] y, con
+    # desde/hasta, el periodo [desde, hasta) sobre columna_fecha
+    query = session.query(modelo)
+    for columna, valor in filtros:
+        query = query.filter(columna == valor)
+    if desde is not None or hasta is not None:
+        limites = [a_fecha(v) if v is not None else None for v in (desde, hasta)]
+        if isinstance(columna_fecha.type, Date):
+            limites = [v.date() if v is not None else None for v in limites]
+        if limites[0] is not None:
+            query = query.filter(columna_fecha >= limites[0])
+        if limites[1] is not None:
+            query = query.filter(columna_fecha < limites[1])
+    return query
+
+
+def pagina(query, modelo, columnas: dict, offset=0, limit=None):
+    # Página por orden de clave primaria con las columnas {etiqueta: columna}
+    query = query.order_by(*modelo.__table__.primary_key.columns)
+    query = query.with_entities(*[columna.label(etiqueta) for etiqueta, columna in columnas.items()])
+    return query.offset(offset).limit(limit)
+
+
+def por_dia(query, columna_fecha):
+    # (día, filas) de la consulta; el periodo ya va filtrado sobre la columna
+    # (indexada), no sobre date(...)
+    dia = func.date(columna_fecha)
+    return query.with_entities(dia, func.count()).filter(
+        columna_fecha.isnot(None)).group_by(dia).order_by(dia)
+
+
+# --- Citas ---
+
+def solapes_desde(desde, duracion_maxima) -> list:
+    # Citas que terminan después de `desde`. Como ninguna dura más de
+    # duracion_maxima, empiezan como pronto en desde - duracion_maxima:
+    # rango acotado por los dos lados en el índice de fecha_inicio
+    desde = a_fecha(desde)
+    return [model.Cita.fecha_inicio >= desde - duracion_maxima, model.Cita.fecha_fin > desde]
+
+
+def citas_en_rango(session, desde, hasta, consulta, duracion_maxima):
+    query = session.query(model.Cita)
+    if consulta is not None:
+        query = query.filter(model.Cita.consulta == consulta)
+    if hasta is not None:
+        query = query.filter(model.Cita.fecha_inicio < a_fecha(hasta))
+    if desde is not None:
+        query = query.filter(*solapes_desde(desde, duracion_maxima))
+    return query.order_by(model.Cita.fecha_inicio)
+
+
+def consultas_ocupadas(session, inicio, fin, consultas, duracion_maxima, excluir=None) -> set:
+    # Consultas de `consultas` con alguna cita que se solapa con [inicio, fin)
+    query = session.query(model.Cita.consulta).filter(
+        model.Cita.consulta.in_(consultas),
+        model.Cita.fecha_inicio < a_fecha(fin),
+        *solapes_desde(inicio, duracion_maxima))
+    if excluir is not None:
+        query = query.filter(model.Cita.id_cita != excluir)
+    return {consulta for consulta, in query.distinct()}
+
+
+# --- Dueños ---
+
+def dueno_con_expediente(session, dni: str):
+    # El dueño y, con selectinload, una consulta por relación (animales,
+    # facturas, citas) para todos a la vez, en lugar de una por fila
+    return session.query(model.Dueno).options(
+        selectinload(model.Dueno.animales),
+        selectinload(model.Dueno.facturas),
+        selectinload(model.Dueno.citas),
+    ).filter(model.Dueno.dni_dueno == dni.strip()).first()
+
+
+def enlazar_con_dueno(session, obj):
+    # Facturas y citas llegan por nombre: se enlazan con el dueño y el animal
+    # si el nombre los identifica (expediente del dueño)
+    dueno = session.query(model.Dueno).filter(
+        model.Dueno.nombre_dueno == obj.nombre_dueno).first()
+    if dueno is not None:
+        obj.dni_dueno = dueno.id_dueno
+        animal = session.query(model.Animal).filter(
+            model.Animal.dni_dueno == dueno.dni_dueno,
+            model.Animal.nombre_animal == obj.nombre_animal).first()
+        if animal is not None:
+            obj.id_animal = animal.id_animal
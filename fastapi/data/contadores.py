@@ -0,0 +1,62 @@
+import threading
+from collections import Counter
+
+from data.agenda import a_fecha
+
+
+# Contadores mantenidos al vuelo para las estadísticas del panel.
+# Se suscribe a un AppendOnlyCSV (reset/added/removed), igual que la agenda,
+# de modo que el total y las altas por día se actualizan con cada alta o baja
+# sin volver a recorrer el fichero.
+class Contador:
+    def __init__(self, campo_fecha=None):
+        self.campo_fecha = campo_fecha
+        self._lock = threading.Lock()
+        self._total = 0
+        self._por_dia = Counter()
+
+    # --- Suscriptor del almacén ---
+
+    def reset(self, rows):
+        with self._lock:
+            self._total = 0
+            self._por_dia = Counter()
+            for row in rows:
+                self._sumar(row, 1)
+
+    def added(self, row):
+        with self._lock:
+            self._sumar(row, 1)
+
+    def removed(self, row):
+        with self._lock:
+            self._sumar(row, -1)
+
+    # --- Consultas ---
+
+    def resumen(self, desde=None, hasta=None) -> dict:
+        # Total y altas por día de [desde, hasta)
+        desde = desde.isoformat() if desde is not None else None
+        hasta = hasta.isoformat() if hasta is not None else None
+        with self._lock:
+            resumen = {"total": self._total}
+            if self.campo_fecha is not None:
+                resumen["por_dia"] = {dia: n for dia, n in sorted(self._por_dia.items())
+                                      if n and (desde is None or dia >= desde) and (hasta is None or dia < hasta)}
+            return resumen
+
+    def _sumar(self, row, n):
+        self._total += n
+        dia = a_dia(row.get(self.campo_fecha)) if self.campo_fecha is not None else None
+        if dia is not None:
+            self._por_dia[dia] += n
+
+
+def a_dia(valor):
+    # Día (AAAA-MM-DD) de una fecha; None si falta o no es una fecha válida
+    if valor is None:
+        return None
+    try:
+        return a_fecha(valor).date().isoformat()
+    except ValueError:
+        return None
@@ -0,0 +1,83 @@
+import os
+import threading
+
+import pandas as pd
+
+
+COLUMNAS_IMPORTE = ["presupuesto_con_iva", "valor_estimado", "importe_adj_con_iva"]
+COLUMNAS_FECHA = {"fecha": "%d/%m/%Y", "fecha_formalizacion": "%d/%m/%y"}
+
+
+# Conjunto público de contratos ya interpretado.
+# El CSV se lee una sola vez (y de nuevo solo si cambia su mtime/tamaño) a un
+# DataFrame con tipos por columna: los importes "42.886,59€" pasan a float y
+# las fechas dd/mm/aa a datetime. El cuerpo JSON de /retrieve_data/ se genera
+# en la misma carga, de modo que cada petición es un acierto de caché y el
+# cliente no tiene que limpiar cadenas.
+class Contratos:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._firma = None
+        self._df = None
+        self._json = None
+
+    def dataframe(self) -> pd.DataFrame:
+        with self._lock:
+            self._cargar_si_cambia()
+            return self._df
+
+    def json(self) -> bytes:
+        # {"contratos": [...]} ya serializado
+        with self._lock:
+            self._cargar_si_cambia()
+            return self._json
+
+    def version(self) -> str:
+        # mtime/tamaño del CSV: cambia cuando cambia el fichero
+        st = os.stat(self.filename)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def ndjson(self, lote: int = 500):
+        # Un contrato por línea, serializado por bloques de filas
+        df = self.dataframe()
+        for inicio in range(0, len(df), lote):
+            lineas = _preparar(df.iloc[inicio:inicio + lote]).to_json(
+                orient="records", lines=True, force_ascii=False)
+            yield lineas if lineas.endswith("\n") else lineas + "\n"
+
+    def _cargar_si_cambia(self):
+        st = os.stat(self.filename)
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return
+        df = pd.read_csv(self.filename, sep=";")
+        for columna in COLUMNAS_IMPORTE:
+            df[columna] = a_euros(df[columna])
+        for columna, formato in COLUMNAS_FECHA.items():
+            df[columna] = pd.to_datetime(df[columna], format=formato, errors="coerce")
+        self._df = df
+        self._json = _a_json(df)
+        self._firma = firma
+
+
+def a_euros(columna: pd.Series) -> pd.Series:
+    # "1.234,56€" -> 1234.56; vacíos o no numéricos -> 0
+    texto = columna.astype("string").str.replace("€", "", regex=False).str.strip()
+    texto = texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce").fillna(0.0).astype(float)
+
+
+def _a_json(df: pd.DataFrame) -> bytes:
+    filas = _preparar(df).to_json(orient="records", force_ascii=False)
+    return ('{"contratos":' + filas + '}').encode("utf-8")
+
+
+def _preparar(df: pd.DataFrame) -> pd.DataFrame:
+    # Fechas como AAAA-MM-DD y números ausentes como 0
+    salida = df.copy()
+    for columna in COLUMNAS_FECHA:
+        salida[columna] = salida[columna].dt.strftime("%Y-%m-%d")
+    numericas = salida.select_dtypes("number").columns
+    salida[numericas] = salida[numericas].fillna(0)
+    return salida
@@ -1,15 +1,54 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from .model import Base
 
 #Configurar la base de datos
-DATABASE_URL = "sqlite:///clinica_veterinaria.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///clinica_veterinaria.db")
+
+# Registro de las sentencias SQL (CLINICA_SQL_LOG=1), desactivado por defecto
+SQL_LOG = os.getenv("CLINICA_SQL_LOG", "0").lower() in ("1", "true", "si", "sí")
+
+# Conexiones del pool: una por hilo de repositorio (CLINICA_HILOS) y algunas de
+# reserva para el hilo de escritura agrupada y las tareas de arranque. Los
+# endpoints síncronos (grupo de hilos de anyio) que pasen de ahí esperan a que
+# se libere una: el pool acota también su trabajo con la base de datos
+POOL = int(os.getenv("CLINICA_POOL", os.getenv("CLINICA_HILOS", "8")))
+
+# PRAGMAs de SQLite aplicados a cada conexión nueva:
+# - WAL: las lecturas no esperan a las escrituras (y viceversa)
+# - synchronous=NORMAL: con WAL, fsync solo en los checkpoints; una caída del
+#   sistema puede perder la última transacción, pero no corrompe la base
+# - mmap_size / cache_size: páginas leídas por mmap y 64 MB de caché por conexión
+# - busy_timeout: esperar al cerrojo de escritura en vez de fallar al momento
+PRAGMAS_SQLITE = [
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+    "temp_store=MEMORY",
+    "busy_timeout=15000",
+]
 
 # Crear el motor de la base de datos
-engine = create_engine(DATABASE_URL, echo=True)
+if DATABASE_URL.startswith("sqlite"):
+    # Las conexiones pasan de un hilo a otro (pool de hilos de FastAPI, hilo
+    # de escritura agrupada): cada una la usa un solo hilo a la vez
+    engine = create_engine(DATABASE_URL, echo=SQL_LOG, pool_size=POOL, max_overflow=4,
+                           connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def configurar_sqlite(conexion, _):
+        cursor = conexion.cursor()
+        for pragma in PRAGMAS_SQLITE:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+else:
+    engine = create_engine(DATABASE_URL, echo=SQL_LOG, pool_size=POOL, max_overflow=4,
+                           pool_pre_ping=True)
 
 # Crear una sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Crear las tablas si no existen
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Escritura agrupada ("group commit").
+# Las altas que llegan a la vez desde varias peticiones se encolan y un único
+# hilo escritor las vuelca juntas con una sola llamada a `escribir(lote)`
+# (una escritura y un fsync en CSV, una transacción en SQL). Tras recibir la
+# primera alta espera como mucho `ventana` segundos a que lleguen más, y
+# mientras escribe un lote se acumula el siguiente. Cada petición espera a que
+# su lote sea duradero y recibe el error del lote si lo hubo.
+class EscrituraAgrupada:
+    def __init__(self, escribir, ventana: float = 0.002, max_lote: int = 500):
+        self._escribir = escribir
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def enviar(self, item):
+        futuro = Future()
+        self._arrancar()
+        self._cola.put((item, futuro))
+        return futuro.result()
+
+    def close(self):
+        with self._lock:
+            if self._hilo is not None:
+                self._cola.put(None)
+                self._hilo.join()
+                self._hilo = None
+
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="escritura-agrupada", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        parar = False
+        while not parar:
+            primero = self._cola.get()
+            if primero is None:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self.ventana
+            while len(lote) < self.max_lote:
+                try:
+                    siguiente = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    parar = True
+                    break
+                lote.append(siguiente)
+            try:
+                self._escribir([item for item, _ in lote])
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+            else:
+                for _, futuro in lote:
+                    futuro.set_result(None)
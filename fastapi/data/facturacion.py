@@ -0,0 +1,90 @@
+import threading
+
+from data.contadores import a_dia
+
+
+# Totales de facturación mantenidos al vuelo: importe y número de facturas en
+# total, por día, por mes y por tratamiento. Con el backend CSV se suscribe al
+# almacén de facturas (reset/added/removed); con el SQL se reconstruye con una
+# consulta agregada al arrancar, se le notifica cada alta propia y se vuelve a
+# reconstruir cuando la tabla cambia por otro worker. En ambos casos los KPI
+# de facturación se sirven sin volver a recorrer las facturas.
+class Facturacion:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vaciar()
+
+    # --- Suscriptor del almacén ---
+
+    def reset(self, rows):
+        with self._lock:
+            self._vaciar()
+            for row in rows:
+                self._sumar_fila(row, 1)
+
+    def added(self, row):
+        with self._lock:
+            self._sumar_fila(row, 1)
+
+    def removed(self, row):
+        with self._lock:
+            self._sumar_fila(row, -1)
+
+    # --- Reconstrucción desde datos ya agregados (GROUP BY día, tratamiento) ---
+
+    def cargar(self, grupos):
+        with self._lock:
+            self._vaciar()
+            for dia, tratamiento, importe, facturas in grupos:
+                self._sumar(dia, tratamiento, importe, facturas)
+
+    # --- Consultas ---
+
+    def resumen(self, desglose: bool = False) -> dict:
+        with self._lock:
+            resumen = {"importe": round(self._importe, 2), "facturas": self._facturas}
+            if desglose:
+                resumen["por_dia"] = _a_dict(self._por_dia)
+                resumen["por_mes"] = _a_dict(self._por_mes)
+                resumen["por_tratamiento"] = _a_dict(self._por_tratamiento)
+            return resumen
+
+    def _vaciar(self):
+        self._importe = 0.0
+        self._facturas = 0
+        self._por_dia = {}          # "AAAA-MM-DD" -> [importe, facturas]
+        self._por_mes = {}          # "AAAA-MM" -> [importe, facturas]
+        self._por_tratamiento = {}  # tratamiento -> [importe, facturas]
+
+    def _sumar_fila(self, row, signo):
+        self._sumar(a_dia(row.get("fecha")), row.get("tratamiento"),
+                    signo * a_importe(row.get("importe_con_iva")), signo)
+
+    def _sumar(self, dia, tratamiento, importe, facturas):
+        self._importe += importe
+        self._facturas += facturas
+        dia = str(dia) if dia is not None else None
+        for grupo, clave in ((self._por_dia, dia),
+                             (self._por_mes, dia[:7] if dia else None),
+                             (self._por_tratamiento, tratamiento)):
+            if clave is None:
+                continue
+            total = grupo.setdefault(clave, [0.0, 0])
+            total[0] += importe
+            total[1] += facturas
+            if total[1] == 0:
+                del grupo[clave]
+
+
+def a_importe(valor) -> float:
+    # Importe numérico; 0 si falta o no es un número
+    try:
+        importe = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if importe != importe else importe  # NaN
+
+
+def _a_dict(grupo) -> dict:
+    return {clave: {"importe": round(importe, 2), "facturas": facturas}
+            for clave, (importe, facturas) in sorted(grupo.items())}
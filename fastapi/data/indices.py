@@ -0,0 +1,44 @@
+import threading
+
+
+# Índice de filas por el valor de un campo (p. ej. dni_dueno o nombre_dueno),
+# en el orden del fichero. Se suscribe a un AppendOnlyCSV (reset/added/
+# removed), igual que la agenda y los contadores, de modo que las filas de un
+# dueño se obtienen sin recorrer todo el fichero. Los valores se comparan como
+# en los filtros de los repositorios: texto sin espacios a los lados.
+class IndicePorCampo:
+    def __init__(self, campo: str):
+        self.campo = campo
+        self._lock = threading.Lock()
+        self._filas = {}  # valor -> [fila]
+
+    # --- Suscriptor del almacén ---
+
+    def reset(self, rows):
+        with self._lock:
+            self._filas = {}
+            for row in rows:
+                self._filas.setdefault(self._valor(row), []).append(row)
+
+    def added(self, row):
+        with self._lock:
+            self._filas.setdefault(self._valor(row), []).append(row)
+
+    def removed(self, row):
+        # El almacén avisa con la misma fila que entregó al darla de alta
+        with self._lock:
+            valor = self._valor(row)
+            filas = [fila for fila in self._filas.get(valor, []) if fila is not row]
+            if filas:
+                self._filas[valor] = filas
+            else:
+                self._filas.pop(valor, None)
+
+    # --- Consultas ---
+
+    def filas(self, valor) -> list:
+        with self._lock:
+            return list(self._filas.get(str(valor).strip(), []))
+
+    def _valor(self, row) -> str:
+        return str(row.get(self.campo)).strip()
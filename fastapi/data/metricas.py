@@ -0,0 +1,283 @@
+import inspect
+import threading
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from fastapi.routing import APIRoute
+
+
+# Métricas del servidor en formato de texto de Prometheus (GET /metrics).
+# - MedirPeticiones (middleware ASGI): latencia, código y tamaño de la
+#   petición y la respuesta de cada ruta.
+# - RutaMedida (route_class de FastAPI): anota la plantilla de la ruta
+#   ("/duenos/{dni_dueno}", no cada DNI) y el momento en que el endpoint
+#   devuelve su resultado.
+# - instrumentar(repositorio): mide cada operación de un repositorio (lectura
+#   o escritura de CSV/SQL) y la suma al tiempo de E/S de la petición en curso.
+# De cada petición se separan dos fases: "repositorio" (E/S de datos) y
+# "serializacion" (desde que el endpoint devuelve su resultado hasta enviar el
+# último byte, sin la E/S hecha mientras tanto, p. ej. en las respuestas ndjson,
+# más lo anotado con sumar_serializacion() por las respuestas que el propio
+# endpoint construye ya serializadas).
+
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SIN_RUTA = "(sin ruta)"
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, limites: tuple = SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = limites
+        self._lock = threading.Lock()
+        # valores de las etiquetas -> [n por cubeta..., n por encima del último límite, suma]
+        self._series = {}
+
+    def observar(self, valor: float, *etiquetas):
+        cubeta = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * (len(self.limites) + 1) + [0.0]
+            serie[cubeta] += 1
+            serie[-1] += valor
+
+    def texto(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(etiquetas, list(serie)) for etiquetas, serie in sorted(self._series.items())]
+        for etiquetas, serie in series:
+            acumulado = 0
+            for limite, n in zip(self.limites + ("+Inf",), serie):
+                acumulado += n
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), etiquetas + (limite,))} "
+                              f"{acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}")
+        return lineas
+
+
+class Total:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def sumar(self, *etiquetas, n: int = 1):
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + n
+
+    def texto(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        lineas += [f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {n}" for etiquetas, n in series]
+        return lineas
+
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    def escapar(valor):
+        return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{nombre}="{escapar(valor)}"' for nombre, valor in zip(nombres, valores)) + "}"
+
+
+PETICIONES = Total("clinica_peticiones_total", "Peticiones atendidas por ruta y código de estado",
+                   ("metodo", "ruta", "codigo"))
+LATENCIA = Histograma("clinica_peticion_segundos", "Duración de la petición hasta el último byte de la respuesta",
+                      ("metodo", "ruta"))
+FASES = Histograma("clinica_fase_segundos", "Tiempo de cada petición en E/S de los repositorios y en serializar "
+                   "la respuesta", ("metodo", "ruta", "fase"))
+BYTES_PETICION = Histograma("clinica_peticion_bytes", "Tamaño del cuerpo de la petición", ("metodo", "ruta"), BYTES)
+BYTES_RESPUESTA = Histograma("clinica_respuesta_bytes", "Tamaño del cuerpo de la respuesta", ("metodo", "ruta"), BYTES)
+REPOSITORIO = Histograma("clinica_repositorio_segundos", "Duración de cada operación de los repositorios",
+                         ("repositorio", "operacion"))
+METRICAS = [PETICIONES, LATENCIA, FASES, BYTES_PETICION, BYTES_RESPUESTA, REPOSITORIO]
+
+
+def texto() -> str:
+    return "\n".join(linea for metrica in METRICAS for linea in metrica.texto()) + "\n"
+
+
+# --- Medida de la petición en curso ---
+
+class _Medida:
+    __slots__ = ("ruta", "repositorio", "serializacion", "fin_endpoint", "repositorio_en_fin", "fin_respuesta")
+
+    def __init__(self):
+        self.ruta = SIN_RUTA
+        self.repositorio = 0.0
+        self.serializacion = 0.0
+        self.fin_endpoint = None
+        self.repositorio_en_fin = 0.0
+        self.fin_respuesta = None
+
+    def registrar(self, metodo, codigo, duracion, recibidos, enviados):
+        PETICIONES.sumar(metodo, self.ruta, codigo)
+        LATENCIA.observar(duracion, metodo, self.ruta)
+        BYTES_PETICION.observar(recibidos, metodo, self.ruta)
+        BYTES_RESPUESTA.observar(enviados, metodo, self.ruta)
+        FASES.observar(self.repositorio, metodo, self.ruta, "repositorio")
+        if self.fin_endpoint is not None and self.fin_respuesta is not None:
+            despues = (self.fin_respuesta - self.fin_endpoint) - (self.repositorio - self.repositorio_en_fin)
+            FASES.observar(self.serializacion + max(despues, 0.0), metodo, self.ruta, "serializacion")
+
+
+# Se copia al hilo de los endpoints síncronos y de run_in_threadpool: todos
+# comparten el mismo objeto _Medida de su petición
+_peticion: ContextVar = ContextVar("peticion", default=None)
+
+
+class MedirPeticiones:
+    # Middleware ASGI puro: no acumula la respuesta, de modo que las
+    # respuestas en streaming siguen enviándose por bloques
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        medida = _Medida()
+        token = _peticion.set(medida)
+        inicio = perf_counter()
+        recibidos = enviados = 0
+        codigo = 500
+
+        async def recibir():
+            nonlocal recibidos
+            mensaje = await receive()
+            recibidos += len(mensaje.get("body", b""))
+            return mensaje
+
+        async def enviar(mensaje):
+            nonlocal enviados, codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            elif mensaje["type"] == "http.response.body":
+                enviados += len(mensaje.get("body", b""))
+                if not mensaje.get("more_body", False):
+                    medida.fin_respuesta = perf_counter()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, recibir, enviar)
+        finally:
+            _peticion.reset(token)
+            medida.registrar(scope["method"], codigo, perf_counter() - inicio, recibidos, enviados)
+
+
+class RutaMedida(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _medir_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+        ruta = self.path
+
+        async def medido(request):
+            # También las peticiones que no llegan al endpoint (422)
+            medida = _peticion.get()
+            if medida is not None:
+                medida.ruta = ruta
+            return await manejador(request)
+        return medido
+
+
+def _medir_endpoint(endpoint):
+    # Mismo tipo (async o no) y firma que el endpoint, para que FastAPI lo
+    # ejecute igual y resuelva los mismos parámetros
+    def fin():
+        medida = _peticion.get()
+        if medida is not None:
+            medida.fin_endpoint = perf_counter()
+            medida.repositorio_en_fin = medida.repositorio
+
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def medido(*args, **kwargs):
+            resultado = await endpoint(*args, **kwargs)
+            fin()
+            return resultado
+    else:
+        @wraps(endpoint)
+        def medido(*args, **kwargs):
+            resultado = endpoint(*args, **kwargs)
+            fin()
+            return resultado
+    return medido
+
+
+def sumar_serializacion(segundos: float):
+    # Solo la hecha dentro del endpoint: la posterior ya está en el intervalo
+    # entre el fin del endpoint y el último byte
+    medida = _peticion.get()
+    if medida is not None and medida.fin_endpoint is None:
+        medida.serializacion += segundos
+
+
+# --- Repositorios ---
+
+class RepositorioMedido:
+    """Envuelve un repositorio y mide cada llamada a sus métodos públicos."""
+
+    def __init__(self, repositorio, nombre: str):
+        self._repositorio = repositorio
+        self._nombre = nombre
+
+    def __getattr__(self, atributo):
+        valor = getattr(self._repositorio, atributo)
+        if atributo.startswith("_") or not callable(valor):
+            return valor
+        return _medir_operacion(valor, self._nombre, atributo)
+
+
+def instrumentar(repositorio, nombre: str) -> RepositorioMedido:
+    return RepositorioMedido(repositorio, nombre)
+
+
+def _sumar_a_peticion(segundos: float):
+    medida = _peticion.get()
+    if medida is not None:
+        medida.repositorio += segundos
+
+
+def _medir_operacion(funcion, repositorio: str, operacion: str):
+    @wraps(funcion)
+    def medida(*args, **kwargs):
+        inicio = perf_counter()
+        try:
+            resultado = funcion(*args, **kwargs)
+        finally:
+            duracion = perf_counter() - inicio
+            _sumar_a_peticion(duracion)
+        if isinstance(resultado, Iterator):
+            # iterar(): la lectura ocurre al consumir el iterador
+            return _iterar_medido(resultado, repositorio, operacion, duracion)
+        REPOSITORIO.observar(duracion, repositorio, operacion)
+        return resultado
+    return medida
+
+
+def _iterar_medido(iterador, repositorio: str, operacion: str, duracion: float):
+    try:
+        while True:
+            inicio = perf_counter()
+            try:
+                valor = next(iterador)
+            except StopIteration:
+                return
+            finally:
+                paso = perf_counter() - inicio
+                duracion += paso
+                _sumar_a_peticion(paso)
+            yield valor
+    finally:
+        if hasattr(iterador, "close"):
+            iterador.close()
+        REPOSITORIO.observar(duracion, repositorio, operacion)
@@ -0,0 +1,159 @@
+"""Crea en una base de datos existente los índices declarados en los modelos.
+
+create_all() solo crea los índices de las tablas nuevas; esta migración añade
+los que falten a las tablas ya creadas y después comprueba con EXPLAIN QUERY
+PLAN que las consultas del calendario, la facturación, el panel y el
+expediente del dueño los usan.
+Las consultas no se escriben aquí: se capturan las que emiten las funciones
+de data/consultas_sql.py (las mismas que usan los repositorios SQL del
+servidor), sobre la base de --url y dentro de una transacción que se deshace
+al terminar. Se ejecuta desde el directorio fastapi/:
+
+    python -m data.migrar_indices [--url sqlite:///clinica_veterinaria.db] [--solo-comprobar]
+
+Termina con código 1 si alguna consulta no usa el índice esperado.
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from data import consultas_sql, model
+from data.model import Base
+
+
+INICIO = datetime(2024, 1, 1, 10, 0)
+FIN = datetime(2024, 1, 1, 10, 30)
+DESDE = date(2024, 1, 1)
+HASTA = date(2024, 2, 1)
+DURACION_MAXIMA = timedelta(hours=24)  # la de las citas por defecto (CLINICA_DURACION_MAXIMA_CITA)
+
+
+def buscar(session, modelo, filtros=(), columna_fecha=None, desde=None, hasta=None, limit=None):
+    # Lo que hace find() en los repositorios: total filtrado y una página
+    query = consultas_sql.filtrar(session, modelo, filtros, columna_fecha, desde, hasta)
+    query.count()
+    return consultas_sql.pagina(query, modelo, dict(modelo.__table__.columns.items()), 0, limit).all()
+
+
+def por_dia(session, modelo, columna_fecha):
+    # Lo que hace estadisticas(): filas por día del periodo
+    return consultas_sql.por_dia(consultas_sql.filtrar(session, modelo, (), columna_fecha, DESDE, HASTA),
+                                 columna_fecha).all()
+
+
+# (consulta, llamada con una sesión que la genera, pasos del plan esperados).
+# Cada SELECT con WHERE que emita la llamada debe contener uno de esos pasos:
+# el índice y las columnas por las que se acota el recorrido
+PLANES = [
+    ("Reserva de consulta (citas solapadas)",
+     lambda s: consultas_sql.consultas_ocupadas(s, INICIO, FIN, ["A", "B"], DURACION_MAXIMA),
+     "ix_citas_consulta_fecha_inicio (consulta=? AND fecha_inicio>? AND fecha_inicio<?)"),
+    ("Calendario (citas de un rango)",
+     lambda s: consultas_sql.citas_en_rango(s, DESDE, HASTA, None, DURACION_MAXIMA).all(),
+     "ix_citas_fecha_inicio (fecha_inicio>? AND fecha_inicio<?)"),
+    ("Calendario de una consulta",
+     lambda s: consultas_sql.citas_en_rango(s, DESDE, HASTA, "A", DURACION_MAXIMA).all(),
+     "ix_citas_consulta_fecha_inicio (consulta=? AND fecha_inicio>? AND fecha_inicio<?)"),
+    ("Facturas de un periodo",
+     lambda s: buscar(s, model.Factura, (), model.Factura.fecha_factura, DESDE, HASTA, 50),
+     "ix_Facturas_fecha_factura (fecha_factura>? AND fecha_factura<?)"),
+    ("Facturas de un dueño",
+     lambda s: buscar(s, model.Factura, [(model.Factura.nombre_dueno, "Dueño 1")]),
+     "ix_Facturas_nombre_dueno (nombre_dueno=?)"),
+    ("Animales de un dueño",
+     lambda s: buscar(s, model.Animal, [(model.Animal.dni_dueno, "00000001R")]),
+     "ix_Animales_dni_dueno (dni_dueno=?)"),
+    ("Animales de una especie",
+     lambda s: buscar(s, model.Animal, [(model.Animal.especie_animal, "Perro")], limit=50),
+     "ix_Animales_especie_animal (especie_animal=?)"),
+    ("Panel: altas de animales por día",
+     lambda s: por_dia(s, model.Animal, model.Animal.fecha_alta),
+     "ix_Animales_fecha_alta (fecha_alta>? AND fecha_alta<?)"),
+    ("Panel: citas por día",
+     lambda s: por_dia(s, model.Cita, model.Cita.fecha_inicio),
+     "ix_citas_fecha_inicio (fecha_inicio>? AND fecha_inicio<?)"),
+    ("Enlace de factura con el dueño",
+     lambda s: consultas_sql.enlazar_con_dueno(s, model.Factura(nombre_dueno="Dueño 1", nombre_animal="Toby")),
+     ("ix_Duenos_nombre_dueno (nombre_dueno=?)", "ix_Animales_dni_dueno (dni_dueno=?)")),
+    ("Expediente del dueño",
+     lambda s: consultas_sql.dueno_con_expediente(s, "00000001R"),
+     ("sqlite_autoindex_Duenos_1 (dni_dueno=?)", "ix_Animales_dni_dueno (dni_dueno=?)",
+      "ix_Facturas_dni_dueno (dni_dueno=?)", "ix_citas_dni_dueno (dni_dueno=?)")),
+]
+
+
+def crear_indices(conn) -> list:
+    creados = []
+    for tabla in Base.metadata.sorted_tables:
+        existentes = {fila[1] for fila in conn.execute(text(f'PRAGMA index_list("{tabla.name}")'))}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                indice.create(conn)
+                creados.append(indice.name)
+    if creados:
+        conn.execute(text("ANALYZE"))
+    return creados
+
+
+def planes(conn) -> list:
+    # [(consulta, [plan de cada SELECT con WHERE], usa el índice esperado)].
+    # Las sesiones sobre `conn` no confirman la transacción ya abierta en ella
+    sesiones = sessionmaker(bind=conn)
+    sentencias = []
+
+    def capturar(_conn, _cursor, sql, parametros, _contexto, varias):
+        if not varias and sql.lstrip().upper().startswith("SELECT") and "WHERE" in sql.split():
+            sentencias.append((sql, parametros))
+
+    resultados = []
+    for descripcion, llamada, esperado in PLANES:
+        sentencias.clear()
+        event.listen(conn, "before_cursor_execute", capturar)
+        try:
+            with sesiones() as session:
+                llamada(session)
+        finally:
+            event.remove(conn, "before_cursor_execute", capturar)
+        explicados = [" | ".join(fila[-1] for fila in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parametros))
+                      for sql, parametros in sentencias]
+        esperados = (esperado,) if isinstance(esperado, str) else esperado
+        resultados.append((descripcion, explicados, bool(explicados) and all(
+            any(paso in plan for paso in esperados) for plan in explicados)))
+    return resultados
+
+
+def comprobar_planes(conn) -> bool:
+    correcto = True
+    for descripcion, explicados, usa_indice in planes(conn):
+        correcto = correcto and usa_indice
+        print(f"{'OK ' if usa_indice else 'MAL'} {descripcion}: {' || '.join(explicados) or 'sin consultas'}")
+    return correcto
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea los índices que falten y comprueba los planes de consulta")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL", "sqlite:///clinica_veterinaria.db"))
+    parser.add_argument("--solo-comprobar", action="store_true", help="no crear índices, solo comprobar")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if engine.dialect.name != "sqlite":
+        sys.exit("La comprobación de planes solo está implementada para SQLite")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        if not args.solo_comprobar:
+            for nombre in crear_indices(conn):
+                print(f"Creado {nombre}")
+    with engine.connect() as conn, conn.begin() as transaccion:
+        correcto = comprobar_planes(conn)
+        transaccion.rollback()
+    engine.dispose()
+    sys.exit(0 if correcto else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Text, ForeignKey
+import time
+
+from sqlalchemy import BigInteger, Column, Integer, String, Date, DateTime, Float, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -10,7 +12,7 @@ class Dueno(Base):
     __tablename__ = 'Duenos'
 
     id_dueno = Column(Integer, primary_key=True, autoincrement=True)
-    nombre_dueno = Column(String, nullable=False)
+    nombre_dueno = Column(String, nullable=False, index=True)  # enlace de facturas por nombre
     telefono_dueno = Column(String, nullable=True)
     email_dueno = Column(String, nullable=False)
     dni_dueno = Column(String, unique=True, nullable=False)
@@ -28,10 +30,11 @@ class Animal(Base):
     id_animal = Column(Integer, primary_key=True, autoincrement=True)
     nombre_animal = Column(String, nullable=False)
     chip_animal = Column(String, unique=True, nullable=False)
-    especie_animal = Column(String, nullable=False)
+    especie_animal = Column(String, nullable=False, index=True)
     nacimiento_animal = Column(Date, nullable=False)
     sexo_animal = Column(String, nullable=False)
-    dni_dueno = Column(Integer, ForeignKey('Duenos.dni_dueno'), nullable=False)
+    fecha_alta = Column(DateTime, nullable=True, index=True)  # altas por día del panel
+    dni_dueno = Column(String, ForeignKey('Duenos.dni_dueno'), nullable=False, index=True)
     
     # Relaciones
     dueno = relationship("Dueno", back_populates="animales")
@@ -42,10 +45,13 @@ class Animal(Base):
 class Factura(Base):
     __tablename__ = 'Facturas'
     id_factura = Column(Integer, primary_key=True, autoincrement=True)
-    dni_dueno = Column(Integer, ForeignKey('Duenos.id_dueno'), nullable=False)
-    id_animal = Column(Integer, ForeignKey('Animales.id_animal'), nullable=False)
+    # La API factura por nombre; el dueño y el animal se enlazan cuando se encuentran
+    dni_dueno = Column(Integer, ForeignKey('Duenos.id_dueno'), nullable=True, index=True)  # expediente del dueño
+    id_animal = Column(Integer, ForeignKey('Animales.id_animal'), nullable=True)
+    nombre_dueno = Column(String, nullable=True, index=True)
+    nombre_animal = Column(String, nullable=True)
     tratamiento = Column(Text, nullable=False)
-    fecha_factura = Column(Date, nullable=False)
+    fecha_factura = Column(Date, nullable=False, index=True)
     precio_sin_iva = Column(Float, nullable=False)
     precio_con_iva = Column(Float, nullable=False)
     
@@ -59,6 +65,9 @@ class Tratamiento(Base):
     id_tratamiento = Column(Integer, primary_key=True, autoincrement=True)
     nombre_tratamiento = Column(String, nullable=False)
     precio_sin_iva = Column(Float, nullable=False)
+    # Lo que registra la API (POST /alta_tratamiento/): importe con IVA y fecha
+    precio_con_iva = Column(Float, nullable=True)
+    fecha = Column(DateTime, nullable=True)
 
 
 # Modelo Cita
@@ -66,15 +75,33 @@ class Cita(Base):
     __tablename__ = 'citas'
 
     id_cita = Column(Integer, primary_key=True, autoincrement=True)
-    dni_dueno = Column(Integer, ForeignKey('Duenos.id_dueno'), nullable=False)
-    id_animal = Column(Integer, ForeignKey('Animales.id_animal'), nullable=False)
-    #nombre_animal = Column(String, nullable=False)
-    #nombre_dueno = Column(String, nullable=False)
+    dni_dueno = Column(Integer, ForeignKey('Duenos.id_dueno'), nullable=True, index=True)  # expediente del dueño
+    id_animal = Column(Integer, ForeignKey('Animales.id_animal'), nullable=True)
+    nombre_animal = Column(String, nullable=True)
+    nombre_dueno = Column(String, nullable=True)
     tratamiento = Column(String, nullable=False)
-    fecha_inicio = Column(DateTime, nullable=False)
+    fecha_inicio = Column(DateTime, nullable=False, index=True)
     fecha_fin = Column(DateTime, nullable=True)
+    consulta = Column(String, nullable=True)
 
     # Relación con Animal
     dueno = relationship("Dueno", back_populates="citas")
     animal = relationship("Animal", back_populates="citas")
 
+    # Reserva de consulta: citas de una consulta que se solapan con un horario
+    __table_args__ = (Index("ix_citas_consulta_fecha_inicio", "consulta", "fecha_inicio"),)
+
+
+# Versión de cada tabla: la API la incrementa en la misma transacción que cada
+# alta, baja o modificación (ETag de los listados, totales de facturación)
+class Version(Base):
+    __tablename__ = 'versiones'
+
+    tabla = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+
+
+def version_inicial() -> int:
+    # Punto de partida de la versión de una tabla nueva o vuelta a crear
+    # (setup_db --reemplazar): no coincide con ninguna versión anterior
+    return time.time_ns()
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+
+# Perfilado por muestreo del proceso en marcha (POST /debug/profile).
+# Un hilo aparte toma cada `intervalo` segundos la pila de todos los demás
+# hilos (sys._current_frames) y cuenta cuántas veces aparece cada pila: el
+# coste depende del intervalo y no del número de llamadas, de modo que se
+# puede usar con carga real. El resultado está en formato "folded" (una línea
+# "hilo;fichero:función;...;fichero:función muestras" por pila), que leen
+# directamente flamegraph.pl, speedscope o inferno.
+
+# Marcos en los que un hilo está esperando trabajo: sus muestras no dicen
+# nada de dónde se va el tiempo y se descartan salvo que se pidan
+INACTIVOS = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("base_events.py", "_run_once"),
+}
+
+# Un único muestreo a la vez por proceso
+_en_curso = threading.Lock()
+
+
+class Muestreador(threading.Thread):
+    def __init__(self, intervalo: float = 0.005, incluir_inactivos: bool = False):
+        super().__init__(name="perfilado", daemon=True)
+        self.intervalo = intervalo
+        self.incluir_inactivos = incluir_inactivos
+        self.pilas = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+
+    def iniciar(self) -> bool:
+        # False si ya hay otro muestreo en curso
+        if not _en_curso.acquire(blocking=False):
+            return False
+        self.start()
+        return True
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+        _en_curso.release()
+
+    def run(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = pila_de(marco)
+                if not self.incluir_inactivos and pila[-1] in INACTIVOS:
+                    continue
+                nombre = nombres.get(ident, str(ident)).replace(";", ",").replace(" ", "_")
+                self.pilas[";".join([nombre] + [f"{fichero}:{funcion}" for fichero, funcion in pila])] += 1
+            self.muestras += 1
+
+    def plegado(self) -> str:
+        return "".join(f"{pila} {n}\n" for pila, n in self.pilas.most_common())
+
+
+def pila_de(marco) -> list:
+    # [(fichero, función)] de la llamada más externa a la más interna
+    pila = []
+    while marco is not None:
+        codigo = marco.f_code
+        pila.append((os.path.basename(codigo.co_filename), codigo.co_name))
+        marco = marco.f_back
+    pila.reverse()
+    return pila
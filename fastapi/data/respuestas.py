@@ -0,0 +1,187 @@
+import json
+import math
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from time import perf_counter
+
+import pandas as pd
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from data import metricas
+
+try:
+    import orjson
+except ImportError:  # Sin orjson: json de la biblioteca estándar, más lento
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Sin brotli: solo gzip
+    brotli = None
+
+
+# Serialización y compresión de las respuestas.
+#
+# RespuestaJSON serializa con orjson, que entiende directamente datetime,
+# date, los escalares de numpy y las claves no str, de modo que los listados
+# se devuelven sin pasar por jsonable_encoder (que recorre y copia cada fila
+# en Python). Los valores de pandas que orjson no conoce (NaT, Timestamp,
+# Decimal) se convierten en a_json_nativo. Los NaN se envían como null, también
+# con el json de la biblioteca estándar (que si no escribiría NaN, no válido).
+#
+# Comprimir negocia Accept-Encoding (brotli si está instalado, si no gzip) y
+# comprime las respuestas JSON y de texto de al menos MINIMO bytes, también
+# las ndjson en streaming (bloque a bloque, con flush para que el cliente
+# reciba cada uno sin esperar al final).
+
+MINIMO = 1024
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 4  # Rápida en CPU con una tasa cercana a gzip -9
+
+
+def a_json_nativo(valor):
+    if pd.api.types.is_scalar(valor) and pd.isna(valor):  # pd.NaT (también un datetime), pd.NA
+        return None
+    if isinstance(valor, (datetime, date)):  # pd.Timestamp es subclase de datetime
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, "item"):  # escalares de numpy no cubiertos por orjson
+        return valor.item()
+    return str(valor)
+
+
+def dumps(contenido) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(contenido, default=a_json_nativo,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_sin_nan(contenido), ensure_ascii=False, separators=(",", ":"), allow_nan=False,
+                      default=lambda valor: _sin_nan(a_json_nativo(valor))).encode("utf-8")
+
+
+def _sin_nan(valor):
+    # NaN e infinitos como null, igual que orjson
+    if isinstance(valor, float):
+        return valor if math.isfinite(valor) else None
+    if isinstance(valor, dict):
+        return {clave: _sin_nan(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_sin_nan(v) for v in valor]
+    return valor
+
+
+class RespuestaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        # Dentro del endpoint (listados devueltos ya como respuesta) el tiempo
+        # se anota aparte para la fase de serialización de /metrics
+        inicio = perf_counter()
+        try:
+            return dumps(content)
+        finally:
+            metricas.sumar_serializacion(perf_counter() - inicio)
+
+
+# --- Compresión ---
+
+class _Gzip:
+    nombre = "gzip"
+
+    def __init__(self):
+        self._z = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def bloque(self, datos: bytes) -> bytes:
+        return self._z.compress(datos) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def fin(self, datos: bytes = b"") -> bytes:
+        return self._z.compress(datos) + self._z.flush()
+
+
+class _Brotli:
+    nombre = "br"
+
+    def __init__(self):
+        self._b = brotli.Compressor(quality=CALIDAD_BROTLI)
+
+    def bloque(self, datos: bytes) -> bytes:
+        return self._b.process(datos) + self._b.flush()
+
+    def fin(self, datos: bytes = b"") -> bytes:
+        return self._b.process(datos) + self._b.finish()
+
+
+CODIFICACIONES = ([_Brotli] if brotli is not None else []) + [_Gzip]
+
+
+def elegir_codificacion(aceptadas: str):
+    # Accept-Encoding con pesos q: "br;q=1.0, gzip;q=0.8, *;q=0"
+    pesos = {}
+    for parte in aceptadas.lower().split(","):
+        nombre, _, parametros = parte.partition(";")
+        q = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        pesos[nombre.strip()] = q
+    for codificacion in CODIFICACIONES:
+        if pesos.get(codificacion.nombre, pesos.get("*", 0.0)) > 0:
+            return codificacion
+    return None
+
+
+def comprimible(cabeceras: Headers) -> bool:
+    tipo = cabeceras.get("content-type", "")
+    return "content-encoding" not in cabeceras and (tipo.startswith("text/") or "json" in tipo)
+
+
+class Comprimir:
+    # Middleware ASGI: como GZipMiddleware de Starlette, con brotli y sin
+    # comprimir lo que ya lo está o no es texto
+    def __init__(self, app, minimo: int = MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        codificacion = None
+        if scope["type"] == "http":
+            codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        inicio = None
+        compresor = None  # None: aún no decidido; False: sin comprimir
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje  # se envía al decidir si se comprime
+                return
+            if mensaje["type"] != "http.response.body":
+                return await send(mensaje)
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if compresor is None:
+                cabeceras = MutableHeaders(raw=inicio["headers"])
+                if not comprimible(cabeceras) or (not mas and len(cuerpo) < self.minimo):
+                    compresor = False
+                else:
+                    compresor = codificacion()
+                    cabeceras["Content-Encoding"] = compresor.nombre
+                    cabeceras.add_vary_header("Accept-Encoding")
+                    if mas:
+                        del cabeceras["Content-Length"]
+                    else:
+                        cuerpo = compresor.fin(cuerpo)
+                        cabeceras["Content-Length"] = str(len(cuerpo))
+                        await send(inicio)
+                        return await send({"type": "http.response.body", "body": cuerpo})
+                await send(inicio)
+            if compresor is False:
+                return await send(mensaje)
+            cuerpo = compresor.bloque(cuerpo) if mas else compresor.fin(cuerpo)
+            await send({"type": "http.response.body", "body": cuerpo, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
@@ -1,119 +1,234 @@
-import sqlite3
+"""Carga masiva de los CSV de la clínica en la base de datos.
+
+Se ejecuta desde el directorio fastapi/, donde están los CSV del backend CSV:
+
+    python -m data.setup_db [--origen DIR] [--url sqlite:///clinica_veterinaria.db] [--reemplazar]
+
+Las tablas se crean a partir de los modelos (data/model.py), de modo que el
+esquema es el mismo que usa el servidor con CLINICA_ALMACENAMIENTO=sql. Cada
+CSV se lee por bloques y se inserta con executemany dentro de una única
+transacción; los índices se construyen al final, una vez cargados los datos.
+El backend CSV admite filas con un DNI, chip o id repetido (las búsquedas
+devuelven la primera): aquí se carga la primera y las demás se descartan y se
+cuentan, en lugar de abortar toda la carga por la restricción de unicidad.
+"""
+import argparse
 import csv
+import os
+import time
+from itertools import islice
+
+from sqlalchemy import Date, DateTime, Float, Integer, create_engine, event, inspect, text
+from sqlalchemy.schema import CreateTable
+
+from data.agenda import a_fecha
+from data.model import Base, version_inicial
+
+
+IVA = 0.21
+BLOQUE = 5000
+
+# Fichero CSV -> (tabla, clave de las bajas, {columna del CSV: columna de la tabla}).
+# El orden es el de carga: los dueños antes que sus animales, facturas y citas.
+CARGAS = [
+    ("registroDuenos.csv", "Duenos", "dni_dueno", {
+        "nombre_dueno": "nombre_dueno",
+        "telefono_dueno": "telefono_dueno",
+        "email_dueno": "email_dueno",
+        "dni_dueno": "dni_dueno",
+        "direccion_dueno": "direccion_dueno",
+    }),
+    ("registroAnimales.csv", "Animales", "chip_animal", {
+        "nombre_animal": "nombre_animal",
+        "chip_animal": "chip_animal",
+        "especie_animal": "especie_animal",
+        "nacimiento_animal": "nacimiento_animal",
+        "sexo": "sexo_animal",
+        "fecha_alta": "fecha_alta",
+        "dni_dueno": "dni_dueno",
+    }),
+    ("registroTratamientos.csv", "Tratamientos", "id", {
+        "id": "id_tratamiento",
+        "nombre_tratamiento": "nombre_tratamiento",
+        "importe_con_iva": "precio_con_iva",
+        "fecha": "fecha",
+    }),
+    ("registroFacturas.csv", "Facturas", None, {
+        "id": "id_factura",
+        "nombre_dueno": "nombre_dueno",
+        "nombre_animal": "nombre_animal",
+        "tratamiento": "tratamiento",
+        "importe_con_iva": "precio_con_iva",
+        "fecha": "fecha_factura",
+    }),
+    ("registroCitas.csv", "citas", "id", {
+        "id": "id_cita",
+        "nombre_animal": "nombre_animal",
+        "nombre_dueno": "nombre_dueno",
+        "tratamiento": "tratamiento",
+        "fecha_inicio": "fecha_inicio",
+        "fecha_fin": "fecha_fin",
+        "consulta": "consulta",
+    }),
+]
+
+def crear_motor(url: str):
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def pragmas_de_carga(conexion, _):
+            # Solo durante la carga: sin fsync, diario WAL y caché grande. Si
+            # la carga se interrumpe, basta con repetirla con --reemplazar
+            cursor = conexion.cursor()
+            for pragma in ("journal_mode=WAL", "synchronous=OFF", "temp_store=MEMORY",
+                           "cache_size=-65536"):
+                cursor.execute(f"PRAGMA {pragma}")
+            cursor.close()
+    return engine
+
+
+def convertidor(columna):
+    # Texto del CSV -> valor del tipo de la columna; vacío -> NULL
+    if isinstance(columna.type, DateTime):
+        convertir = a_fecha
+    elif isinstance(columna.type, Date):
+        convertir = lambda valor: a_fecha(valor).date()
+    elif isinstance(columna.type, Float):
+        convertir = float
+    elif isinstance(columna.type, Integer):
+        convertir = lambda valor: int(float(valor))
+    else:
+        convertir = str
+    return lambda valor: convertir(valor) if valor not in (None, "") else None
+
+
+def bajas(fichero: str) -> dict:
+    # Lápidas del almacén CSV (ver data/storage.py): clave -> filas que había
+    # al darla de baja. Las filas anteriores con esa clave están borradas
+    lapidas = {}
+    if os.path.exists(f"{fichero}.bajas"):
+        with open(f"{fichero}.bajas", newline="", encoding="utf-8") as f:
+            for clave, filas in csv.reader(f):
+                lapidas[clave] = int(filas)
+    return lapidas
+
+
+def enlazador(conn):
+    # Igual que al dar de alta por la API: cada factura o cita se enlaza con el primer
+    # dueño con ese nombre y con su animal del mismo nombre. Los dueños y
+    # animales ya cargados se leen una vez a memoria en lugar de buscarlos
+    # factura a factura
+    duenos = {}
+    for id_dueno, nombre, dni in conn.execute(text(
+            "SELECT id_dueno, nombre_dueno, dni_dueno FROM Duenos ORDER BY id_dueno DESC")):
+        duenos[nombre] = (id_dueno, dni)
+    animales = {}
+    for id_animal, dni, nombre in conn.execute(text(
+            "SELECT id_animal, dni_dueno, nombre_animal FROM Animales ORDER BY id_animal DESC")):
+        animales[(dni, nombre)] = id_animal
+
+    def enlazar(fila):
+        id_dueno, dni = duenos.get(fila["nombre_dueno"], (None, None))
+        fila["dni_dueno"] = id_dueno
+        fila["id_animal"] = animales.get((dni, fila["nombre_animal"]))
+    return enlazar
+
+
+def unicas(tabla, columnas) -> list:
+    # Columnas cargadas con valores que no se pueden repetir
+    return [col.name for col in tabla.columns
+            if (col.primary_key or col.unique) and col.name in columnas.values()]
+
+
+def filas(fichero: str, tabla, clave, columnas: dict, enlazar=None, descartadas=None):
+    # Genera diccionarios {columna de la tabla: valor} con las filas vivas del
+    # CSV. Las que repiten una columna única se cuentan en descartadas[tabla]
+    convertir = {csv_col: (col, convertidor(tabla.c[col])) for csv_col, col in columnas.items()}
+    lapidas = bajas(fichero) if clave is not None else {}
+    vistas = {col: set() for col in unicas(tabla, columnas)}
+    with open(fichero, newline="", encoding="utf-8") as f:
+        for posicion, registro in enumerate(csv.DictReader(f)):
+            if lapidas and posicion < lapidas.get(str(registro.get(clave)).strip(), 0):
+                continue
+            fila = {col: conv(registro.get(csv_col)) for csv_col, (col, conv) in convertir.items()}
+            if any(fila[col] is not None and fila[col] in valores for col, valores in vistas.items()):
+                if descartadas is not None:
+                    descartadas[tabla.name] = descartadas.get(tabla.name, 0) + 1
+                continue
+            for col, valores in vistas.items():
+                if fila[col] is not None:
+                    valores.add(fila[col])
+            if tabla.name in ("Tratamientos", "Facturas"):
+                fila["precio_sin_iva"] = (round(fila["precio_con_iva"] / (1 + IVA), 2)
+                                          if fila["precio_con_iva"] is not None else None)
+            if enlazar is not None:
+                enlazar(fila)
+            yield fila
+
+
+def por_bloques(iterable, tamano: int):
+    iterador = iter(iterable)
+    while bloque := list(islice(iterador, tamano)):
+        yield bloque
+
+
+def cargar(url: str, origen: str, reemplazar: bool = False, bloque: int = BLOQUE) -> dict:
+    # tabla -> (filas cargadas, filas descartadas por clave repetida, segundos)
+    engine = crear_motor(url)
+    tablas = Base.metadata.sorted_tables
+    cargadas = {}
+    descartadas = {}
+    with engine.begin() as conn:
+        if reemplazar:
+            Base.metadata.drop_all(conn)
+        # Tablas sin índices (CREATE TABLE solo): se construyen al final, con
+        # los datos ya dentro
+        existentes = set(inspect(conn).get_table_names())
+        for tabla in tablas:
+            if tabla.name not in existentes:
+                conn.execute(CreateTable(tabla))
+        for fichero, nombre, clave, columnas in CARGAS:
+            ruta = os.path.join(origen, fichero)
+            if not os.path.exists(ruta):
+                continue
+            tabla = Base.metadata.tables[nombre]
+            inicio = time.perf_counter()
+            total = 0
+            enlazar = enlazador(conn) if nombre in ("Facturas", "citas") else None
+            for lote in por_bloques(filas(ruta, tabla, clave, columnas, enlazar, descartadas), bloque):
+                conn.execute(tabla.insert(), lote)
+                total += len(lote)
+            cargadas[nombre] = (total, descartadas.get(nombre, 0), time.perf_counter() - inicio)
+        # Versión nueva de cada tabla cargada: las copias que tengan los
+        # clientes (ETag de los listados) dejan de ser válidas
+        versiones = Base.metadata.tables["versiones"]
+        for nombre in cargadas:
+            conn.execute(versiones.delete().where(versiones.c.tabla == nombre))
+            conn.execute(versiones.insert(), {"tabla": nombre, "version": version_inicial()})
+        for tabla in tablas:
+            for indice in tabla.indexes:
+                indice.create(conn, checkfirst=True)
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+    engine.dispose()
+    return cargadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga los CSV de la clínica en la base de datos")
+    parser.add_argument("--origen", default=".", help="directorio con los CSV")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL", "sqlite:///clinica_veterinaria.db"))
+    parser.add_argument("--reemplazar", action="store_true", help="borrar las tablas antes de cargar")
+    parser.add_argument("--bloque", type=int, default=BLOQUE, help="filas por executemany")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    cargadas = cargar(args.url, args.origen, args.reemplazar, args.bloque)
+    for nombre, (total, repetidas, segundos) in cargadas.items():
+        aviso = f"  ({repetidas} descartadas por clave repetida)" if repetidas else ""
+        print(f"{nombre:<14}{total:>9} filas {segundos:>8.2f} s{aviso}")
+    print(f"Total: {time.perf_counter() - inicio:.2f} s")
+
 
-#Crear la base de datos y las tablas
-conn = sqlite3.connect('clinica_veterinaria.db')
-cursor = conn.cursor()
-
-#Crear las tablas
-#DUEÑOS
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Duenos(
-    id_dueno INTEGER PRIMARY KEY AUTOINCREMENT,
-    nombre_dueno TEXT NOT NULL,
-    telefono_dueno INTEGER NOT NULL,
-    email_dueno TEXT NOT NULL,
-    dni_dueno TEXT NOT NULL,
-    direccion_dueno TEXT NOT NULL
-);
-""")
-#Cargar datos de dueños
-with open("registroDuenos.csv", "r", encoding="utf-8") as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)
-    for row in csv_reader:
-        cursor.execute("""
-            INSERT INTO Duenos(id_dueno, nombre_dueno, telefono_dueno, email_dueno, dni_dueno, direccion_dueno)
-            VALUES(?,?,?,?,?,?)
-            """, (row[0], row[1], row[2], row[3], row[4], row[5]))
-
-#ANIMALES
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Animales(
-    id_animal INTEGER PRIMARY KEY AUTOINCREMENT,
-    nombre_animal TEXT NOT NULL,
-    chip_animal INTEGER NOT NULL,
-    especie_animal TEXT NOT NULL,
-    nacimiento_animal TEXT NOT NULL,
-    sexo_animal TEXT NOT NULL,
-    id_dueno INTEGER NOT NULL,
-    FOREIGN KEY(id_dueno) REFERENCES Duenos(id_dueno)
-);
-""")
-#Cargar datos de animales
-with open("registroAnimales.csv", "r", encoding="utf-8") as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)
-    for row in csv_reader:
-        cursor.execute("""
-            INSERT INTO Animales(id_animal, nombre_animal, chip_animal, especie_animal, nacimiento_animal, sexo_animal, id_dueno)
-            VALUES(?,?,?,?,?,?,?)
-            """, (row[0], row[1], row[2], row[3], row[4], row[5], row[6]))
-
-#FACTURAS
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Facturas(
-    id_factura INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_dueno INTEGER NOT NULL,
-    FOREIGN KEY(id_dueno) REFERENCES Duenos(id_dueno),
-    id_animal INTEGER NOT NULL,
-    FOREIGN KEY(id_animal) REFERENCES Animales(id_animal),
-    tratamiento TEXT NOT NULL,
-    fecha_factura TEXT NOT NULL,
-    precio_sin_iva REAL NOT NULL,
-    precio_con_iva REAL NOT NULL
-);
-""")
-#Cargar datos de facturas
-with open("registroFacturas.csv", "r", encoding="utf-8") as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)
-    for row in csv_reader:
-        cursor.execute("""
-            INSERT INTO Facturas(id_factura, id_dueno, id_animal, tratamiento, fecha_factura, precio_sin_iva, precio_con_iva)
-            VALUES(?,?,?,?,?,?,?)
-            """, (row[0], row[1], row[2], row[3], row[4], row[5], row[6]))
-
-
-#TRATAMIENTOS
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Tratamientos(
-    id_tratamiento INTEGER PRIMARY KEY AUTOINCREMENT,
-    nombre_tratamiento TEXT NOT NULL,
-    precio_sin_iva REAL NOT NULL
-);
-""")
-#Cargar datos de tratamientos
-with open("registroTratamientos.csv", "r", encoding="utf-8") as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)
-    for row in csv_reader:
-        cursor.execute("""
-            INSERT INTO Tratamientos(id_tratamiento, nombre_tratamiento, precio_sin_iva)
-            VALUES(?,?,?)
-            """, (row[0], row[1], row[2]))
-
-
-#CITAS
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Citas(
-    id_cita INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_animal INTEGER NOT NULL,
-    FOREIGN KEY(id_animal) REFERENCES Animales(id_animal),
-    id_dueno INTEGER NOT NULL,
-    FOREIGN KEY(id_dueno) REFERENCES Duenos(id_dueno),
-    fecha_inicio TEXT NOT NULL,
-    fecha_fin TEXT NOT NULL,
-    tratamiento TEXT NOT NULL
-);
-""")
-# Insertar las citas en la tabla
-citas_db = [{"id_cita", "id_animal", "id_dueno", "fecha_inicio", "fecha_fin", "tratamiento"}]
-for cita in citas_db:
-    cursor.execute("""
-    INSERT INTO Citas (id_cita, id_animal, id_dueno, fecha_inicio, fecha_fin, tratamiento)
-    VALUES (?,?,?,?,?,?)
-    """, (cita["fecha"], cita["hora"], cita["id_dueno"], cita["descripcion"]))
-
-conn.commit()
-conn.close()  # Close the connection to the database
\ No newline at end of file
+if __name__ == "__main__":
+    main()
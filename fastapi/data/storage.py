@@ -0,0 +1,439 @@
+import bisect
+import csv
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from data.agenda import a_fecha
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo cerrojo entre hilos del mismo proceso
+    fcntl = None
+
+
+# Almacenamiento CSV de solo anexado.
+# Cada alta escribe únicamente la fila nueva al final del fichero, en lugar de
+# leer y reescribir el CSV completo. Las bajas se anotan como "lápidas" en un
+# fichero auxiliar (<fichero>.bajas) con la clave borrada y el número de filas
+# que había en ese momento, de modo que una fila vuelta a dar de alta después
+# de la baja sigue siendo visible. Al superar un número de lápidas, o al cerrar
+# el servidor, se compacta el CSV reescribiéndolo sin las filas borradas.
+#
+# Las filas vivas se mantienen en memoria junto con un índice hash por la
+# clave (DNI, chip...) y, si se indica date_column, una lista ordenada por esa
+# fecha (interpretada una sola vez al cargar la fila) para los filtros por
+# periodo, de modo que las consultas no vuelven a leer el fichero.
+# Si el CSV o sus bajas cambian en disco por otra vía (inodo/mtime/tamaño
+# distintos de los que dejó la última escritura propia) la caché se actualiza:
+# si el CSV solo ha crecido se leen únicamente las filas nuevas del final, y
+# en cualquier otro caso (compactación, bajas) se vuelve a cargar entero.
+#
+# Varios procesos (workers de uvicorn) pueden compartir los mismos ficheros:
+# las escrituras se hacen con un cerrojo exclusivo de fcntl.flock sobre
+# <fichero>.lock y las lecturas con uno compartido, de modo que nadie lee una
+# compactación a medias ni anexa a un fichero ya sustituido. Con locked() los
+# repositorios agrupan comprobación y alta (reserva de citas, ids) en una
+# misma sección crítica entre procesos.
+#
+# Otros índices derivados (agenda de citas, contadores...) pueden suscribirse
+# con subscribe(): reciben reset(filas) en cada carga completa y added(fila) /
+# removed(fila) en cada alta o baja.
+class AppendOnlyCSV:
+    def __init__(self, filename: str, columns, key=None, text_columns=(), date_column=None,
+                 fsync_every: int = 32, fsync_interval: float = 1.0,
+                 compact_after: int = 100):
+        self.filename = filename
+        self.tombstones_file = f"{filename}.bajas"
+        self.columns = list(columns)
+        self.key = key
+        # Columnas leídas como texto y no con el tipo que deduce pandas: un
+        # chip "00123" no es el número 123
+        self.dtypes = {column: str for column in text_columns}
+        self.date_column = date_column
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+
+        self._lock = threading.RLock()
+        self._lock_file = f"{filename}.lock"
+        self._lock_handle = None
+        self._lock_depth = 0
+        self._lock_mode = None
+        self._handle = None
+        self._header = None
+        self._records = None  # posición en el CSV -> fila (solo filas vivas)
+        self._index = {}      # clave normalizada -> posiciones
+        self._by_date = []    # [(fecha, posición)] ordenada (con date_column)
+        self._rows = 0        # filas físicas del CSV, vivas o borradas
+        self._tombstones = {}
+        self._signature = None
+        self._listeners = []
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer = None
+
+    # --- Lectura ---
+
+    def exists(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def records(self) -> list:
+        with self.locked(shared=True):
+            self._ensure_loaded()
+            return list(self._records.values())
+
+    def get(self, key_value):
+        with self.locked(shared=True):
+            self._ensure_loaded()
+            positions = self._index.get(_normalize(key_value))
+            return self._records[positions[0]] if positions else None
+
+    def between(self, since=None, until=None) -> list:
+        # Filas con date_column en [since, until), en el orden del fichero:
+        # búsqueda binaria en la lista ordenada, sin recorrer las demás filas
+        with self.locked(shared=True):
+            self._ensure_loaded()
+            lo = 0 if since is None else bisect.bisect_left(self._by_date, (a_fecha(since),))
+            hi = len(self._by_date) if until is None else bisect.bisect_left(self._by_date, (a_fecha(until),))
+            return [self._records[position] for position in sorted(p for _, p in self._by_date[lo:hi])]
+
+    def refresh(self):
+        # Actualiza la caché (y avisa a los suscriptores) si el fichero cambió
+        with self.locked(shared=True):
+            self._ensure_loaded()
+
+    def reload(self):
+        # Relectura completa del fichero, haya cambiado o no
+        with self.locked(shared=True):
+            self._flush()
+            self._load()
+
+    def version(self) -> str:
+        # Firma (inodo, mtime, tamaño) del CSV y de sus bajas con lo escrito ya
+        # volcado: cambia con cada alta, baja o compactación, de este proceso
+        # o de otro. Sirve de ETag sin leer las filas
+        with self.locked(shared=True):
+            self._flush()
+            return repr(self._current_signature())
+
+    def subscribe(self, listener):
+        with self.locked(shared=True):
+            self._ensure_loaded()
+            self._listeners.append(listener)
+            listener.reset(list(self._records.values()))
+
+    # --- Escritura ---
+
+    def append(self, row: dict):
+        self.append_many([row])
+
+    def append_many(self, rows, sync: bool = False):
+        # Varias filas con una sola escritura; con sync=True además se hace
+        # fsync antes de volver (lote duradero)
+        rows = list(rows)
+        if not rows:
+            return
+        with self.locked():
+            # Con el cerrojo tomado: incorporar antes lo anexado por otros procesos
+            self._ensure_loaded()
+            header = self._header
+            if header is None:
+                header = self.columns
+                csv.writer(self._open(), lineterminator="\n").writerow(header)
+                self._header = header
+            else:
+                new_columns = list(dict.fromkeys(c for row in rows for c in row if c not in header))
+                if new_columns:
+                    # Columna nueva: hay que reescribir la cabecera antes de anexar
+                    self._rewrite(header + new_columns)
+                    self._ensure_loaded()
+                    header = self._header
+            self._write_rows(rows, header)
+            if sync:
+                self.sync()
+
+    def _write_rows(self, rows, header):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in rows:
+            writer.writerow([row.get(column) for column in header])
+        lines = buffer.getvalue()
+
+        handle = self._open()
+        handle.write(lines)
+        handle.flush()
+
+        # Mismos tipos que tendría la fila al releer el CSV con pandas
+        parsed = self._read_csv(io.StringIO(lines), names=header, header=None)
+        for row in _to_records(parsed):
+            self._insert(self._rows, row)
+            self._index_date(self._rows, row)
+            self._rows += 1
+            for listener in self._listeners:
+                listener.added(row)
+        self._signature = self._current_signature()
+
+        self._pending += len(rows)
+        if (self._pending >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+        else:
+            self._schedule_sync()
+
+    def delete(self, key_value: str):
+        with self.locked():
+            if not self.exists():
+                raise FileNotFoundError(self.filename)
+            self._ensure_loaded()
+            key_value = _normalize(key_value)
+            with open(self.tombstones_file, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f, lineterminator="\n").writerow([key_value, self._rows])
+            self._tombstones[key_value] = self._rows
+            for position in self._index.pop(key_value, []):
+                row = self._records.pop(position)
+                self._unindex_date(position, row)
+                for listener in self._listeners:
+                    listener.removed(row)
+            self._signature = self._current_signature()
+            if len(self._tombstones) >= self.compact_after:
+                self.compact()
+
+    # --- Cerrojo entre hilos y procesos ---
+
+    @contextmanager
+    def locked(self, shared: bool = False):
+        # Reentrante: solo la sección más externa toma y suelta el flock; una
+        # escritura dentro de una lectura eleva el cerrojo a exclusivo
+        mode = None if fcntl is None else (fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        with self._lock:
+            previous = self._lock_mode
+            if mode is not None and (self._lock_depth == 0
+                                     or (mode == fcntl.LOCK_EX and previous == fcntl.LOCK_SH)):
+                if self._lock_handle is None:
+                    self._lock_handle = open(self._lock_file, "a")
+                fcntl.flock(self._lock_handle.fileno(), mode)
+                self._lock_mode = mode
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if mode is not None and self._lock_depth == 0:
+                    fcntl.flock(self._lock_handle.fileno(), fcntl.LOCK_UN)
+                    self._lock_mode = None
+                elif mode is not None and self._lock_mode != previous:
+                    fcntl.flock(self._lock_handle.fileno(), previous)
+                    self._lock_mode = previous
+
+    # --- Mantenimiento ---
+
+    def sync(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+            self._pending = 0
+            self._last_sync = time.monotonic()
+
+    def _schedule_sync(self):
+        # Sin más escrituras, las filas pendientes se vuelcan igualmente como
+        # mucho fsync_interval segundos después
+        if self._sync_timer is None:
+            self._sync_timer = threading.Timer(self.fsync_interval, self._timed_sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+    def _timed_sync(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._pending:
+                self.sync()
+
+    def compact(self):
+        with self.locked():
+            if not self.exists() or not os.path.exists(self.tombstones_file):
+                return
+            self._ensure_loaded()
+            self._rewrite(self._header, keep=set(self._records))
+
+    def close(self):
+        with self.locked():
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            self.sync()
+            self.compact()
+            self._close_handle()
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def _rewrite(self, header, keep=None):
+        # Reescritura completa del CSV, copiando las líneas tal cual, con
+        # sustitución atómica del fichero. Con `keep` solo se conservan esas
+        # posiciones (compactación) y las lápidas dejan de ser necesarias.
+        self._close_handle()
+        tmp = f"{self.filename}.tmp"
+        with open(self.filename, newline="", encoding="utf-8") as src, \
+                open(tmp, "w", newline="", encoding="utf-8") as dst:
+            reader = csv.reader(src)
+            next(reader, None)
+            writer = csv.writer(dst, lineterminator="\n")
+            writer.writerow(header)
+            position = 0
+            for values in reader:
+                if not values:
+                    continue  # pandas ignora las líneas en blanco
+                if keep is None or position in keep:
+                    writer.writerow(values + [""] * (len(header) - len(values)))
+                position += 1
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.filename)
+        if keep is not None and os.path.exists(self.tombstones_file):
+            os.remove(self.tombstones_file)
+        self._records = None
+        self._pending = 0
+
+    # --- Caché en memoria ---
+
+    def _ensure_loaded(self):
+        self._flush()
+        if self._records is None:
+            self._load()
+            return
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+        if _grown(self._signature, signature) and self._header is not None:
+            self._load_tail(signature)
+        else:
+            self._load()
+
+    def _load_tail(self, signature):
+        # Solo se ha anexado al final (otro proceso): leer las filas nuevas
+        with open(self.filename, "rb") as f:
+            f.seek(self._signature[0][2])
+            tail = f.read(signature[0][2] - self._signature[0][2]).decode("utf-8")
+        if tail.strip():
+            parsed = self._read_csv(io.StringIO(tail), names=self._header, header=None)
+            for row in _to_records(parsed):
+                self._insert(self._rows, row)
+                self._index_date(self._rows, row)
+                self._rows += 1
+                for listener in self._listeners:
+                    listener.added(row)
+        self._signature = signature
+
+    def _load(self):
+        # El fichero pudo sustituirse (compactación de otro proceso): no
+        # seguir anexando al inodo antiguo
+        self._close_handle()
+        self._records = {}
+        self._index = {}
+        self._by_date = []
+        self._rows = 0
+        self._header = None
+        self._tombstones = {}
+        if self.exists() and os.path.getsize(self.filename) > 0:
+            df = self._read_csv(self.filename)
+            self._header = list(df.columns)
+            for position, row in enumerate(_to_records(df)):
+                self._insert(position, row)
+            self._rows = len(df)
+        if os.path.exists(self.tombstones_file):
+            with open(self.tombstones_file, newline="", encoding="utf-8") as f:
+                for key_value, rows in csv.reader(f):
+                    self._tombstones[key_value] = int(rows)
+            for key_value, rows in self._tombstones.items():
+                positions = self._index.get(key_value, [])
+                for position in [p for p in positions if p < rows]:
+                    positions.remove(position)
+                    del self._records[position]
+                if not positions:
+                    self._index.pop(key_value, None)
+        if self.date_column is not None:
+            # Una sola ordenación para toda la carga
+            fechas = ((_to_datetime(row.get(self.date_column)), position)
+                      for position, row in self._records.items())
+            self._by_date = sorted((fecha, position) for fecha, position in fechas if fecha is not None)
+        self._signature = self._current_signature()
+        for listener in self._listeners:
+            listener.reset(list(self._records.values()))
+
+    def _read_csv(self, source, **kwargs) -> pd.DataFrame:
+        return pd.read_csv(source, dtype=self.dtypes or None, **kwargs)
+
+    def _insert(self, position, row):
+        self._records[position] = row
+        if self.key is not None:
+            self._index.setdefault(_normalize(row.get(self.key)), []).append(position)
+
+    def _index_date(self, position, row):
+        fecha = _to_datetime(row.get(self.date_column)) if self.date_column is not None else None
+        if fecha is not None:
+            bisect.insort(self._by_date, (fecha, position))
+
+    def _unindex_date(self, position, row):
+        fecha = _to_datetime(row.get(self.date_column)) if self.date_column is not None else None
+        if fecha is not None:
+            i = bisect.bisect_left(self._by_date, (fecha, position))
+            if i < len(self._by_date) and self._by_date[i] == (fecha, position):
+                del self._by_date[i]
+
+    def _current_signature(self):
+        return _stat(self.filename), _stat(self.tombstones_file)
+
+    # --- Auxiliares ---
+
+    def _open(self):
+        if self._handle is None:
+            self._handle = open(self.filename, "a", newline="", encoding="utf-8")
+        return self._handle
+
+    def _flush(self):
+        if self._handle is not None:
+            self._handle.flush()
+
+    def _close_handle(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def _to_records(df: pd.DataFrame) -> list:
+    # Celdas vacías como None (NaN no es JSON válido)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _to_datetime(value):
+    # Fecha de la fila; None si falta o no es una fecha válida
+    if value is None:
+        return None
+    try:
+        return a_fecha(value)
+    except ValueError:
+        return None
+
+
+def _normalize(value) -> str:
+    return str(value).strip()
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _grown(old, new) -> bool:
+    # Mismo fichero de datos, más largo, y las mismas bajas
+    return (old is not None and old[0] is not None and new[0] is not None
+            and old[0][0] == new[0][0] and new[0][2] > old[0][2] and old[1] == new[1])
@@ -1,16 +1,57 @@
 import os
-import pandas as pd
+import hmac
+import hashlib
+import threading
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel as PydanticBaseModel
-from typing import List, Optional
-from datetime import datetime, date
+from itertools import islice
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import anyio.to_thread
+from pydantic import BaseModel as PydanticBaseModel, ValidationError
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+from datetime import datetime, date, timedelta
 #from data import SessionLocal, engine
 from data import *
+from data.storage import AppendOnlyCSV
+from data.agenda import Agenda, a_fecha
+from data.contadores import Contador
+from data.indices import IndicePorCampo
+from data.facturacion import Facturacion, a_importe
+from data.contratos import Contratos
+from data.escritura import EscrituraAgrupada
+from data import metricas
+from data.metricas import MedirPeticiones, RutaMedida, instrumentar
+from data.perfilado import Muestreador
+from data.respuestas import Comprimir, RespuestaJSON, dumps
+from data import model
+from data import consultas_sql
+from data.consultas_sql import enlazar_con_dueno
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
-app = FastAPI()
+# Respuestas JSON serializadas con orjson (ver data/respuestas.py)
+app = FastAPI(default_response_class=RespuestaJSON)
+# Latencia, tamaños y tiempo de E/S y de serialización por ruta (GET /metrics)
+app.router.route_class = RutaMedida
+# gzip/brotli según Accept-Encoding. Se añade antes que las métricas para
+# quedar por dentro: /metrics cuenta los bytes comprimidos, los que viajan
+app.add_middleware(Comprimir)
+app.add_middleware(MedirPeticiones)
 DATBASE_URL = "sqlite:///clinica_veterinaria.db"
 
+# Almacenamiento de dueños, animales, facturas, citas y tratamientos: "csv" (por defecto) o "sql"
+ALMACENAMIENTO = os.getenv("CLINICA_ALMACENAMIENTO", "csv").lower()
+IVA = 0.21
+GASTOS_FIJOS_FACTURA = 10  # Gastos fijos por factura (material de consulta)
+# Consultas en las que se pueden reservar citas (recursos del calendario)
+CONSULTAS = os.getenv("CLINICA_CONSULTAS", "A,B").split(",")
+# Duración máxima de una cita: acota por abajo la búsqueda de solapes por
+# hora de inicio en el backend SQL
+DURACION_MAXIMA_CITA = timedelta(hours=float(os.getenv("CLINICA_DURACION_MAXIMA_CITA", "24")))
+# Token de administración de POST /debug/profile; sin él el perfilado está desactivado
+PERFILADO_TOKEN = os.getenv("CLINICA_PERFILADO_TOKEN")
+
 # Modelos de datos
 class BaseModel(PydanticBaseModel):
     class Config:
@@ -45,7 +86,7 @@ class Cita(BaseModel):
     tratamiento: str
     fecha_inicio: datetime
     fecha_fin: datetime
-    consulta: str
+    consulta: Optional[str] = None  # Sin consulta se asigna la primera libre
 
 class Factura(BaseModel):
     id: Optional[int]
@@ -63,8 +104,48 @@ class DataRepository:
     def add(self, item: dict):
         raise NotImplementedError
 
+    def add_many(self, items: List[dict]):
+        # Alta de varios registros con una sola escritura
+        raise NotImplementedError
+
+    def get(self, identifier: str) -> Optional[dict]:
+        raise NotImplementedError
+
     def delete(self, identifier: str):
         raise NotImplementedError
+
+    def find(self, filters: Optional[dict] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, offset: int = 0, limit: Optional[int] = None,
+             fields: Optional[List[str]] = None) -> Tuple[int, List[dict]]:
+        # Filtros de igualdad, periodo [since, until) sobre campo_fecha, página
+        # y proyección. Devuelve el total filtrado y las filas de la página.
+        raise NotImplementedError
+
+    def iterar(self, filters: Optional[dict] = None, since: Optional[datetime] = None,
+               until: Optional[datetime] = None, offset: int = 0, limit: Optional[int] = None,
+               fields: Optional[List[str]] = None) -> Iterator[dict]:
+        # Igual que find() pero entregando las filas una a una, sin total,
+        # para las respuestas en streaming
+        raise NotImplementedError
+
+    def estadisticas(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> dict:
+        # {"total": n} y, si hay campo_fecha, {"por_dia": {"AAAA-MM-DD": n}}
+        # con los días de [desde, hasta)
+        raise NotImplementedError
+
+    def version(self) -> Optional[str]:
+        # Etiqueta que cambia con cada alta o baja de la colección (ETag de
+        # los listados); None si no hay una forma barata de calcularla
+        return None
+
+    def close(self):
+        pass
+
+def validar_campos(fields: Optional[List[str]], disponibles: List[str]) -> Optional[List[str]]:
+    desconocidos = [campo for campo in fields or [] if campo not in disponibles]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+    return fields or None
     
 def beneficio_neto(df):
     if df is None or 'importe_adj_con_iva' not in df.columns:
@@ -81,117 +162,684 @@ def beneficio_neto(df):
     beneficio_neto = ingresos_totales - gastos_totales
     return beneficio_neto
 
-# Implementación para Dueños
-class DuenoRepository(DataRepository):
+# Repositorio base sobre un CSV de solo anexado (ver data/storage.py)
+class CSVRepository(DataRepository):
+    columnas: List[str] = []
+    texto: List[str] = []  # columnas que se leen del CSV como texto
+    clave: Optional[str] = None
+    campo_fecha: Optional[str] = None
+    indexados: List[str] = []  # campos de filtro con índice en memoria
+    mensaje_vacio = "No hay registros"
+
     def __init__(self, filename: str):
         self.filename = filename
+        self.store = AppendOnlyCSV(filename, self.columnas, self.clave, self.texto, self.campo_fecha)
+        self.contador = Contador(self.campo_fecha)
+        self.store.subscribe(self.contador)
+        self.indices = {campo: IndicePorCampo(campo) for campo in self.indexados}
+        for indice in self.indices.values():
+            self.store.subscribe(indice)
 
     def get_all(self) -> List[dict]:
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            return df.to_dict(orient="records")
-        raise HTTPException(status_code=404, detail="No hay dueños registrados")
-
-    def add(self, dueno: Dueno):
-        nuevo_registro = pd.DataFrame([dueno.dict()])
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            df = pd.concat([df, nuevo_registro], ignore_index=True)
-        else:
-            df = nuevo_registro
-        df.to_csv(self.filename, index=False)
-
-    def delete(self, dni_dueno: str):
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            df = df[df["dni_dueno"] != dni_dueno]
-            df.to_csv(self.filename, index=False)
-        else:
+        if self.store.exists():
+            return self.store.records()
+        raise HTTPException(status_code=404, detail=self.mensaje_vacio)
+
+    def get(self, identifier: str) -> Optional[dict]:
+        # Búsqueda por clave en el índice en memoria del almacén
+        return self.store.get(identifier)
+
+    def add(self, item):
+        self.store.append(a_datos(item))
+
+    def add_many(self, items):
+        self.store.append_many([a_datos(item) for item in items], sync=True)
+
+    def delete(self, identifier: str):
+        try:
+            self.store.delete(identifier)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Archivo de registros no encontrado.")
 
-class TratamientoRepository(DataRepository):
-    def __init__(self, filename: str):
-        self.filename = filename
-        if not os.path.exists(self.filename):
-            df = pd.DataFrame(columns=["id", "nombre_tratamiento", "importe_con_iva", "fecha"])
-            df.to_csv(self.filename, index=False)
+    def find(self, filters=None, since=None, until=None, offset=0, limit=None, fields=None):
+        fields = validar_campos(fields, self.columnas)
+        filas = list(self._filtrar(filters, since, until))
+        total = len(filas)
+        filas = filas[offset:None if limit is None else offset + limit]
+        if fields:
+            filas = [{campo: fila.get(campo) for campo in fields} for fila in filas]
+        return total, filas
 
-    def add(self, tratamiento: Tratamiento):
-        # Leer el archivo existente para obtener el siguiente ID
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            next_id = df['id'].max() + 1 if not df.empty else 1  # Obtener el siguiente ID
-            tratamiento.id = next_id  # Asignar el ID al tratamiento
-            nuevo_registro = pd.DataFrame([tratamiento.dict()])
-            df = pd.concat([df, nuevo_registro], ignore_index=True)
-            df.to_csv(self.filename, index=False)
+    def iterar(self, filters=None, since=None, until=None, offset=0, limit=None, fields=None):
+        # Validación inmediata (400 antes de empezar a enviar); filtrado perezoso
+        fields = validar_campos(fields, self.columnas)
+        filas = islice(self._filtrar(filters, since, until), offset,
+                       None if limit is None else offset + limit)
+        if fields:
+            return ({campo: fila.get(campo) for campo in fields} for fila in filas)
+        return filas
+
+    def _filtrar(self, filters, since, until) -> Iterator[dict]:
+        if not self.store.exists():
+            return iter([])
+        filtros = {campo: str(valor).strip() for campo, valor in (filters or {}).items() if valor is not None}
+        indexado = next((campo for campo in filtros if campo in self.indices), None)
+        if since is not None or until is not None:
+            # Solo las filas del periodo, por el índice de fechas del almacén
+            filas = self.store.between(since, until)
+        elif indexado is not None:
+            # Solo las filas con ese valor (p. ej. las de un dueño)
+            self.store.refresh()
+            filas = self.indices[indexado].filas(filtros[indexado])
         else:
-            raise HTTPException(status_code=404, detail="Archivo de tratamientos no encontrado.")
+            filas = self.store.records()
+        if filtros:
+            filas = (fila for fila in filas
+                     if all(str(fila.get(campo)).strip() == valor for campo, valor in filtros.items()))
+        return iter(filas)
+
+    def estadisticas(self, desde=None, hasta=None) -> dict:
+        # Contadores mantenidos por el almacén en cada alta y baja
+        self.store.refresh()
+        return self.contador.resumen(desde, hasta)
+
+    def version(self) -> Optional[str]:
+        return self.store.version()
+
+    def close(self):
+        self.store.close()
+
+def campos_texto(modelo) -> List[str]:
+    # Campos str del modelo: "00123" debe seguir siendo "00123" al releerlo
+    return [nombre for nombre, campo in modelo.__fields__.items() if campo.type_ is str]
+
+def a_datos(item) -> dict:
+    return item.dict() if isinstance(item, PydanticBaseModel) else dict(item)
+
+def nuevo_expediente(dueno: dict, animales: list, facturas: list, citas: list) -> dict:
+    importe = sum(a_importe(factura.get("importe_con_iva")) for factura in facturas)
+    return {"dueno": dueno, "animales": animales, "facturas": facturas, "citas": citas,
+            "facturacion": {"importe": round(importe, 2), "facturas": len(facturas)}}
+
+# Implementación para Dueños
+class DuenoRepository(CSVRepository):
+    columnas = list(Dueno.__fields__)
+    texto = campos_texto(Dueno)
+    clave = "dni_dueno"
+    mensaje_vacio = "No hay dueños registrados"
+
+class TratamientoRepository(CSVRepository):
+    columnas = list(Tratamiento.__fields__)
+    texto = campos_texto(Tratamiento)
+    clave = "id"
+    campo_fecha = "fecha"
+    mensaje_vacio = "No hay tratamientos registrados"
+
+    def add(self, tratamiento: Tratamiento):
+        # Siguiente ID a partir del mayor registrado, con el fichero bloqueado
+        # para que otro worker no asigne el mismo
+        with self.store.locked():
+            ids = [fila["id"] for fila in self.get_all_or_empty() if fila["id"] is not None]
+            tratamiento.id = int(max(ids)) + 1 if ids else 1
+            super().add(tratamiento)
+
+    def get_all_or_empty(self) -> List[dict]:
+        return self.store.records() if self.store.exists() else []
+
+class FacturaRepository(CSVRepository):
+    columnas = list(Factura.__fields__)
+    texto = campos_texto(Factura)
+    campo_fecha = "fecha"
+    indexados = ["nombre_dueno"]
+    mensaje_vacio = "No hay facturas registradas"
 
-class FacturaRepository(DataRepository):
     def __init__(self, filename: str):
-        self.filename = filename
+        super().__init__(filename)
+        self.facturacion = Facturacion()
+        self.store.subscribe(self.facturacion)
+        # Altas concurrentes agrupadas en una escritura con fsync (ver data/escritura.py)
+        self.escritura = EscrituraAgrupada(self.add_many)
 
-    def get_all(self) -> List[dict]:
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            return df.to_dict(orient="records")
-        raise HTTPException(status_code=404, detail="No hay facturas registradas")
-
-    def add(self, factura: dict):
-        nuevo_registro = pd.DataFrame([factura])
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            df = pd.concat([df, nuevo_registro], ignore_index=True)
-        else:
-            df = nuevo_registro
-        df.to_csv(self.filename, index=False)
+    def add(self, item):
+        self.escritura.enviar(a_datos(item))
+
+    def close(self):
+        self.escritura.close()
+        super().close()
+
+    def totales(self, desglose: bool = False) -> dict:
+        # Totales mantenidos por el almacén en cada alta
+        self.store.refresh()
+        return self.facturacion.resumen(desglose)
+
+    def recalcular_totales(self):
+        # Reconstrucción desde el CSV, releyéndolo por completo
+        self.store.reload()
 
-# Inicialización del repositorio de facturas
-factura_repository = FacturaRepository("registroFacturas.csv")
 # Implementación para Animales
-class AnimalRepository(DataRepository):
+class AnimalRepository(CSVRepository):
+    columnas = list(Animal.__fields__)
+    texto = campos_texto(Animal)
+    clave = "chip_animal"
+    campo_fecha = "fecha_alta"
+    indexados = ["dni_dueno"]
+    mensaje_vacio = "No hay animales registrados"
+
+# Citas: CSV de solo anexado con índice por id (el del almacén) y por
+# intervalo horario de cada consulta (data/agenda.py)
+class CitaRepository(CSVRepository):
+    columnas = list(Cita.__fields__)
+    texto = campos_texto(Cita)
+    clave = "id"
+    campo_fecha = "fecha_inicio"
+    indexados = ["nombre_dueno"]
+    mensaje_vacio = "No hay citas registradas"
+
     def __init__(self, filename: str):
-        self.filename = filename
+        super().__init__(filename)
+        self.agenda = Agenda()
+        self.store.subscribe(self.agenda)
 
     def get_all(self) -> List[dict]:
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            return df.to_dict(orient="records")
-        raise HTTPException(status_code=404, detail="No hay animales registrados")
-
-    def add(self, animal: Animal):
-        nuevo_registro = pd.DataFrame([animal.dict()])
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            df = pd.concat([df, nuevo_registro], ignore_index=True)
-        else:
-            df = nuevo_registro
-        df.to_csv(self.filename, index=False)
-
-    def delete(self, chip_animal: str):
-        if os.path.exists(self.filename):
-            df = pd.read_csv(self.filename)
-            df = df[df["chip_animal"].astype(str) != chip_animal]  # Asegúrate de que se compare como string
-            df.to_csv(self.filename, index=False)
-        else:
-            raise HTTPException(status_code=404, detail="Archivo de registros no encontrado.")
+        return self.store.records() if self.store.exists() else []
+
+    def add(self, cita: Cita) -> dict:
+        # Comprobación de hueco y alta bajo el mismo cerrojo (también entre
+        # workers, ver AppendOnlyCSV.locked): reserva atómica
+        datos = cita.dict()
+        with self.store.locked():
+            self.store.refresh()
+            datos["consulta"] = reservar_consulta(datos, self.consultas_libres)
+            datos["id"] = self.agenda.ultimo_id + 1
+            self.store.append(datos)
+            return self.store.get(datos["id"])
+
+    def update(self, cita_id: int, datos: dict) -> Optional[dict]:
+        # Se da de baja la versión anterior y se anexa la nueva con el mismo id
+        with self.store.locked():
+            actual = self.store.get(cita_id)
+            if actual is None:
+                return None
+            nueva = Cita(**{**actual, **datos, "id": cita_id}).dict()
+            nueva["consulta"] = reservar_consulta(
+                nueva, lambda *args: self.consultas_libres(*args, excluir=cita_id))
+            self.store.delete(cita_id)
+            self.store.append(nueva)
+            return self.store.get(cita_id)
+
+    def delete(self, cita_id: int) -> bool:
+        with self.store.locked():
+            if self.store.get(cita_id) is None:
+                return False
+            self.store.delete(cita_id)
+            return True
+
+    def en_rango(self, desde=None, hasta=None, consulta=None) -> List[dict]:
+        self.store.refresh()
+        return [self.store.get(cita_id) for cita_id in self.agenda.solapadas(desde, hasta, consulta)]
+
+    def consultas_libres(self, inicio, fin, consultas=CONSULTAS, excluir=None) -> List[str]:
+        self.store.refresh()
+        return [c for c in consultas
+                if not [i for i in self.agenda.solapadas(inicio, fin, c) if i != excluir]]
+
+def reservar_consulta(cita: dict, consultas_libres) -> str:
+    # Consulta pedida si está libre o, si no se indica, la primera libre
+    if a_fecha(cita["fecha_fin"]) <= a_fecha(cita["fecha_inicio"]):
+        raise HTTPException(status_code=400, detail="La cita debe terminar después de empezar")
+    if a_fecha(cita["fecha_fin"]) - a_fecha(cita["fecha_inicio"]) > DURACION_MAXIMA_CITA:
+        raise HTTPException(status_code=400, detail=f"La cita no puede durar más de "
+                            f"{DURACION_MAXIMA_CITA.total_seconds() / 3600:g} horas")
+    candidatas = [cita["consulta"]] if cita.get("consulta") else CONSULTAS
+    libres = consultas_libres(cita["fecha_inicio"], cita["fecha_fin"], candidatas)
+    if not libres:
+        detalle = (f"La consulta {cita['consulta']} está ocupada en ese horario" if cita.get("consulta")
+                   else "No hay consultas libres en ese horario")
+        raise HTTPException(status_code=409, detail=detalle)
+    return libres[0]
+
+# Repositorio base sobre los modelos SQLAlchemy de data/model.py
+class SQLRepository(DataRepository):
+    modelo = None
+    clave: Optional[str] = None
+    campo_fecha: Optional[str] = None
+    campos: dict = {}  # campo de la API -> columna del modelo
+    mensaje_vacio = "No hay registros"
+    mensaje_duplicado = "El registro ya existe"
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.tabla = self.modelo.__tablename__
+        self._crear_version()
+
+    def get_all(self) -> List[dict]:
+        with self.session_factory() as session:
+            return [self._a_dict(obj) for obj in session.query(self.modelo).all()]
+
+    def get(self, identifier: str) -> Optional[dict]:
+        # Consulta por la columna única (índice del motor), no por recorrido
+        with self.session_factory() as session:
+            obj = session.query(self.modelo).filter(
+                getattr(self.modelo, self.clave) == identifier.strip()).first()
+            return self._a_dict(obj) if obj is not None else None
+
+    def add(self, item):
+        self.add_many([item])
+
+    def add_many(self, items) -> Optional[int]:
+        # Una sola transacción para todo el lote; devuelve la nueva versión de la tabla
+        try:
+            with self.session_factory() as session, session.begin():
+                session.add_all([self._a_modelo(a_datos(item), session) for item in items])
+                return self._nueva_version(session)
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail=self.mensaje_duplicado)
+
+    def delete(self, identifier: str):
+        with self.session_factory() as session, session.begin():
+            if session.query(self.modelo).filter(
+                    getattr(self.modelo, self.clave) == identifier.strip()).delete():
+                self._nueva_version(session)
+
+    def find(self, filters=None, since=None, until=None, offset=0, limit=None, fields=None):
+        # Filtros, orden, página y proyección resueltos por el motor SQL
+        fields = validar_campos(fields, list(self.campos)) or list(self.campos)
+        with self.session_factory() as session:
+            query = self._consulta(session, filters, since, until)
+            total = query.count()
+            filas = self._pagina(query, offset, limit, fields).all()
+            return total, [dict(fila._mapping) for fila in filas]
+
+    def iterar(self, filters=None, since=None, until=None, offset=0, limit=None, fields=None):
+        fields = validar_campos(fields, list(self.campos)) or list(self.campos)
+        return self._iterar(filters, since, until, offset, limit, fields)
+
+    def _iterar(self, filters, since, until, offset, limit, fields):
+        # La sesión sigue abierta mientras se envía la respuesta; las filas
+        # llegan del cursor por lotes en lugar de cargarse todas a la vez
+        with self.session_factory() as session:
+            query = self._pagina(self._consulta(session, filters, since, until), offset, limit, fields)
+            for fila in query.yield_per(500):
+                yield dict(fila._mapping)
+
+    # Las consultas en sí están en data/consultas_sql.py
+    def _consulta(self, session, filters, since, until):
+        filtros = [(self._columna(campo), valor) for campo, valor in (filters or {}).items() if valor is not None]
+        columna_fecha = self._columna(self.campo_fecha) if self.campo_fecha is not None else None
+        return consultas_sql.filtrar(session, self.modelo, filtros, columna_fecha, since, until)
+
+    def _pagina(self, query, offset, limit, fields):
+        return consultas_sql.pagina(query, self.modelo, {campo: self._columna(campo) for campo in fields},
+                                    offset, limit)
+
+    def estadisticas(self, desde=None, hasta=None) -> dict:
+        # COUNT y GROUP BY por día resueltos por el motor SQL
+        with self.session_factory() as session:
+            resumen = {"total": session.query(func.count()).select_from(self.modelo).scalar()}
+            if self.campo_fecha is not None:
+                filas = consultas_sql.por_dia(self._consulta(session, None, desde, hasta),
+                                              self._columna(self.campo_fecha))
+                resumen["por_dia"] = {str(d): n for d, n in filas}
+            return resumen
+
+    def version(self) -> Optional[str]:
+        # Contador de la tabla en `versiones`, incrementado en la misma
+        # transacción que cada escritura, también de otros procesos. (El
+        # número de filas y el id máximo no sirven: SQLite reutiliza el id
+        # más alto tras borrarlo)
+        with self.session_factory() as session:
+            version = self._version_actual(session)
+            return str(version) if version is not None else None
+
+    def _version_actual(self, session) -> Optional[int]:
+        return session.query(model.Version.version).filter(model.Version.tabla == self.tabla).scalar()
+
+    def _crear_version(self):
+        try:
+            with self.session_factory() as session, session.begin():
+                if session.get(model.Version, self.tabla) is None:
+                    session.add(model.Version(tabla=self.tabla, version=model.version_inicial()))
+        except IntegrityError:
+            pass  # La ha creado a la vez otro worker
+
+    def _nueva_version(self, session) -> Optional[int]:
+        session.query(model.Version).filter(model.Version.tabla == self.tabla).update(
+            {model.Version.version: model.Version.version + 1}, synchronize_session=False)
+        return self._version_actual(session)
+
+    def _columna(self, campo: str):
+        return getattr(self.modelo, self.campos[campo])
+
+    @classmethod
+    def _a_dict(cls, obj) -> dict:
+        return {campo: getattr(obj, columna) for campo, columna in cls.campos.items()}
+
+    def _a_modelo(self, datos: dict, session):
+        return self.modelo(**{columna: datos.get(campo) for campo, columna in self.campos.items()})
+
+class SQLDuenoRepository(SQLRepository):
+    modelo = model.Dueno
+    clave = "dni_dueno"
+    campos = {campo: campo for campo in Dueno.__fields__}
+    mensaje_duplicado = "Ya existe un dueño con ese DNI"
+
+    def expediente(self, dni: str) -> Optional[dict]:
+        with self.session_factory() as session:
+            dueno = consultas_sql.dueno_con_expediente(session, dni)
+            if dueno is None:
+                return None
+            return nuevo_expediente(
+                self._a_dict(dueno),
+                [SQLAnimalRepository._a_dict(a) for a in sorted(dueno.animales, key=lambda a: a.id_animal)],
+                [SQLFacturaRepository._a_dict(f) for f in sorted(dueno.facturas, key=lambda f: f.id_factura)],
+                [SQLCitaRepository._a_dict(c) for c in sorted(dueno.citas, key=lambda c: c.id_cita)])
+
+class SQLAnimalRepository(SQLRepository):
+    modelo = model.Animal
+    clave = "chip_animal"
+    campo_fecha = "fecha_alta"
+    campos = dict({campo: campo for campo in Animal.__fields__}, sexo="sexo_animal")
+    mensaje_duplicado = "Ya existe un animal con ese chip"
+
+class SQLTratamientoRepository(SQLRepository):
+    modelo = model.Tratamiento
+    clave = "id_tratamiento"
+    campo_fecha = "fecha"
+    campos = {
+        "id": "id_tratamiento",
+        "nombre_tratamiento": "nombre_tratamiento",
+        "importe_con_iva": "precio_con_iva",
+        "fecha": "fecha",
+    }
+
+    def _a_modelo(self, datos: dict, session):
+        # El id lo asigna el motor; el precio sin IVA se deriva como en las facturas
+        tratamiento = super()._a_modelo(datos, session)
+        tratamiento.id_tratamiento = None
+        tratamiento.precio_sin_iva = round(tratamiento.precio_con_iva / (1 + IVA), 2)
+        return tratamiento
+
+class SQLFacturaRepository(SQLRepository):
+    modelo = model.Factura
+    campo_fecha = "fecha"
+    campos = {
+        "id": "id_factura",
+        "nombre_dueno": "nombre_dueno",
+        "nombre_animal": "nombre_animal",
+        "tratamiento": "tratamiento",
+        "importe_con_iva": "precio_con_iva",
+        "fecha": "fecha_factura",
+    }
+
+    def __init__(self, session_factory):
+        super().__init__(session_factory)
+        self.facturacion = Facturacion()
+        self._lock_totales = threading.Lock()
+        self._version_totales = None  # versión de la tabla que reflejan los totales
+        self.recalcular_totales()
+        # Altas concurrentes agrupadas en una sola transacción (ver data/escritura.py)
+        self.escritura = EscrituraAgrupada(self.add_many)
+
+    def add(self, item):
+        self.escritura.enviar(a_datos(item))
+
+    def add_many(self, items):
+        lote = [a_datos(item) for item in items]
+        version = super().add_many(lote)
+        with self._lock_totales:
+            if version is not None and self._version_totales == version - 1:
+                # Nadie más ha escrito desde la última versión conocida: basta
+                # con sumar el lote
+                for datos in lote:
+                    self.facturacion.added(datos)
+                self._version_totales = version
+            else:
+                self._version_totales = None  # se recalculan en la próxima lectura
+
+    def close(self):
+        self.escritura.close()
+
+    def totales(self, desglose: bool = False) -> dict:
+        # Si la tabla ha cambiado por otra vía (otro worker), se recalculan
+        with self.session_factory() as session:
+            actual = self._version_actual(session)
+        if actual != self._version_totales:
+            self.recalcular_totales()
+        return self.facturacion.resumen(desglose)
+
+    def recalcular_totales(self):
+        # Una única consulta agregada por día y tratamiento. Si la versión de
+        # la tabla es la misma antes y después, ninguna escritura se ha
+        # colado entre medias y los totales corresponden a esa versión
+        dia = func.date(model.Factura.fecha_factura)
+        with self._lock_totales, self.session_factory() as session:
+            version = None
+            for _ in range(3):
+                antes = self._version_actual(session)
+                grupos = session.query(dia, model.Factura.tratamiento,
+                                       func.coalesce(func.sum(model.Factura.precio_con_iva), 0), func.count()
+                                       ).group_by(dia, model.Factura.tratamiento).all()
+                if self._version_actual(session) == antes:
+                    version = antes
+                    break
+            self.facturacion.cargar(grupos)
+            self._version_totales = version
+
+    def _a_modelo(self, datos: dict, session):
+        factura = super()._a_modelo(datos, session)
+        factura.id_factura = None
+        if isinstance(factura.fecha_factura, datetime):
+            factura.fecha_factura = factura.fecha_factura.date()
+        factura.precio_sin_iva = round(factura.precio_con_iva / (1 + IVA), 2)
+        enlazar_con_dueno(session, factura)
+        return factura
+
+class SQLCitaRepository(SQLRepository):
+    modelo = model.Cita
+    campo_fecha = "fecha_inicio"
+    campos = {campo: campo for campo in Cita.__fields__}
+    campos["id"] = "id_cita"
+
+    def __init__(self, session_factory):
+        super().__init__(session_factory)
+        self._lock = threading.Lock()
+        # Las citas nuevas no duran más de DURACION_MAXIMA_CITA; las ya
+        # guardadas (p. ej. cargadas con setup_db) pueden ampliar la ventana
+        self.duracion_maxima = max(DURACION_MAXIMA_CITA, self._duracion_registrada())
+
+    def get_all(self) -> List[dict]:
+        with self.session_factory() as session:
+            return [self._a_dict(obj) for obj in session.query(model.Cita).order_by(model.Cita.id_cita)]
+
+    def get(self, cita_id: int) -> Optional[dict]:
+        with self.session_factory() as session:
+            obj = session.get(model.Cita, cita_id)
+            return self._a_dict(obj) if obj is not None else None
+
+    # Reserva atómica también entre workers: la transacción empieza
+    # incrementando la versión de la tabla, lo que toma el cerrojo de escritura
+    # de la base (en SQLite, el de toda la base; en otros motores, el de la
+    # fila de `versiones`) antes de comprobar el hueco. Otra reserva espera a
+    # que esta termine y ve ya su cita. Si la reserva falla, el rollback
+    # deshace también el incremento
+    def add(self, cita: Cita) -> dict:
+        datos = cita.dict()
+        with self._lock, self.session_factory() as session, session.begin():
+            self._nueva_version(session)
+            datos["consulta"] = reservar_consulta(
+                datos, lambda *args: self._libres(session, *args))
+            obj = self._a_modelo(datos, session)
+            obj.id_cita = None
+            enlazar_con_dueno(session, obj)
+            session.add(obj)
+            session.flush()
+            return self._a_dict(obj)
+
+    def update(self, cita_id: int, datos: dict) -> Optional[dict]:
+        with self._lock, self.session_factory() as session, session.begin():
+            self._nueva_version(session)
+            obj = session.get(model.Cita, cita_id)
+            if obj is None:
+                session.rollback()  # sin cambios: la versión no se incrementa
+                return None
+            nueva = Cita(**{**self._a_dict(obj), **datos, "id": cita_id}).dict()
+            nueva["consulta"] = reservar_consulta(
+                nueva, lambda *args: self._libres(session, *args, excluir=cita_id))
+            enlazada = (obj.nombre_dueno, obj.nombre_animal)
+            for campo, columna in self.campos.items():
+                setattr(obj, columna, nueva[campo])
+            if (obj.nombre_dueno, obj.nombre_animal) != enlazada:
+                # Otro dueño o animal: se enlaza de nuevo, como en el alta
+                obj.dni_dueno = obj.id_animal = None
+                enlazar_con_dueno(session, obj)
+            return self._a_dict(obj)
+
+    def delete(self, cita_id: int) -> bool:
+        with self.session_factory() as session, session.begin():
+            if session.query(model.Cita).filter(model.Cita.id_cita == cita_id).delete() == 0:
+                return False
+            self._nueva_version(session)
+            return True
+
+    def en_rango(self, desde=None, hasta=None, consulta=None) -> List[dict]:
+        with self.session_factory() as session:
+            return [self._a_dict(obj) for obj in consultas_sql.citas_en_rango(
+                session, desde, hasta, consulta, self.duracion_maxima)]
+
+    def consultas_libres(self, inicio, fin, consultas=CONSULTAS, excluir=None) -> List[str]:
+        with self.session_factory() as session:
+            return self._libres(session, inicio, fin, consultas, excluir)
+
+    def _libres(self, session, inicio, fin, consultas=CONSULTAS, excluir=None) -> List[str]:
+        ocupadas = consultas_sql.consultas_ocupadas(session, inicio, fin, consultas, self.duracion_maxima, excluir)
+        return [c for c in consultas if c not in ocupadas]
+
+    def _duracion_registrada(self) -> timedelta:
+        with self.session_factory() as session:
+            filas = session.query(model.Cita.fecha_inicio, model.Cita.fecha_fin).filter(
+                model.Cita.fecha_fin.isnot(None)).yield_per(5000)
+            return max((fin - inicio for inicio, fin in filas), default=timedelta(0))
 
 # Inicialización de los repositorios
-dueno_repository = DuenoRepository("registroDuenos.csv")
-animal_repository = AnimalRepository("registroAnimales.csv")
-tratamiento_repository = TratamientoRepository("registroTratamientos.csv")
-factura_repository = FacturaRepository("registroFacturas.csv")
+if ALMACENAMIENTO == "sql":
+    from data.database import SessionLocal
+    dueno_repository = SQLDuenoRepository(SessionLocal)
+    animal_repository = SQLAnimalRepository(SessionLocal)
+    factura_repository = SQLFacturaRepository(SessionLocal)
+    cita_repository = SQLCitaRepository(SessionLocal)
+    tratamiento_repository = SQLTratamientoRepository(SessionLocal)
+else:
+    dueno_repository = DuenoRepository("registroDuenos.csv")
+    animal_repository = AnimalRepository("registroAnimales.csv")
+    factura_repository = FacturaRepository("registroFacturas.csv")
+    cita_repository = CitaRepository("registroCitas.csv")
+    tratamiento_repository = TratamientoRepository("registroTratamientos.csv")
+# Cada operación de los repositorios se mide para /metrics
+dueno_repository = instrumentar(dueno_repository, "duenos")
+animal_repository = instrumentar(animal_repository, "animales")
+factura_repository = instrumentar(factura_repository, "facturas")
+cita_repository = instrumentar(cita_repository, "citas")
+tratamiento_repository = instrumentar(tratamiento_repository, "tratamientos")
+contratos = Contratos("./contratos_inscritos_simplificado_2023.csv")
+
+# Las lecturas y escrituras de los repositorios (disco, pandas, SQL) son
+# bloqueantes. Los endpoints async las ejecutan con en_hilo(), en hilos con su
+# propio límite (CLINICA_HILOS), sin parar el bucle de eventos. Los síncronos
+# siguen en el grupo de hilos por defecto de anyio (40): ahí esperan también
+# las altas de facturas a su escritura agrupada, sin quitar hilos al resto
+HILOS = int(os.getenv("CLINICA_HILOS", "8"))
+REPOSITORIO = anyio.CapacityLimiter(HILOS)
+
+async def en_hilo(funcion: Callable, *args):
+    return await anyio.to_thread.run_sync(funcion, *args, limiter=REPOSITORIO)
+
+@app.on_event("startup")
+def precargar_contratos():
+    # Interpretar el CSV de contratos al arrancar y no en la primera petición
+    try:
+        contratos.json()
+    except FileNotFoundError:
+        logging.warning(f"No se encuentra el fichero de contratos {contratos.filename}")
+
+@app.on_event("shutdown")
+def cerrar_repositorios():
+    # Volcar a disco las altas pendientes y compactar las bajas
+    for repository in (dueno_repository, animal_repository, factura_repository, cita_repository,
+                       tratamiento_repository):
+        repository.close()
+
+# Paginación, proyección y formato comunes a los listados
+class Paginacion:
+    def __init__(self, limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0),
+                 fields: Optional[str] = Query(None, description="Campos separados por comas"),
+                 formato: str = Query("json", regex="^(json|ndjson)$",
+                                      description="ndjson: una fila JSON por línea, en streaming")):
+        self.limit = limit
+        self.offset = offset
+        self.fields = [campo.strip() for campo in fields.split(",") if campo.strip()] if fields else None
+        self.formato = formato
+
+def listar(repository: DataRepository, paginacion: Paginacion,
+           filtros: Optional[dict] = None, desde: Optional[Union[datetime, date]] = None,
+           hasta: Optional[Union[datetime, date]] = None,
+           transformar: Optional[Callable[[dict], dict]] = None):
+    if paginacion.formato == "ndjson":
+        # Streaming: las filas se serializan a medida que se leen, sin total
+        filas = repository.iterar(filtros, desde, hasta, paginacion.offset,
+                                  paginacion.limit, paginacion.fields)
+        return respuesta_ndjson(map(transformar, filas) if transformar else filas)
+    # El total filtrado va en la cabecera para no cambiar el formato (lista) de la respuesta
+    total, filas = repository.find(filtros, desde, hasta, paginacion.offset,
+                                   paginacion.limit, paginacion.fields)
+    # Ya serializada: las filas son tipos básicos y fechas, no hace falta
+    # pasarlas por jsonable_encoder
+    return RespuestaJSON([transformar(fila) for fila in filas] if transformar else filas,
+                         headers={"X-Total-Count": str(total)})
+
+def etiqueta(request: Request, version: Optional[str]) -> Optional[str]:
+    # ETag débil: versión de la colección más los parámetros de la consulta
+    # (página, campos, filtros y formato dan cuerpos distintos)
+    if version is None:
+        return None
+    resumen = hashlib.blake2b(f"{version}|{request.url.query}".encode(), digest_size=12).hexdigest()
+    return f'W/"{resumen}"'
+
+def condicional(request: Request, response: Response, version: Optional[str], generar: Callable):
+    # GET condicional: si el cliente ya tiene esta versión (If-None-Match),
+    # 304 sin cuerpo; si no, la respuesta de generar() con su ETag. La
+    # versión se toma antes de leer los datos: una escritura intermedia como
+    # mucho provoca una descarga de más, nunca un 304 con datos viejos
+    etag = etiqueta(request, version)
+    if etag is not None:
+        # Comparación débil: W/"x" y "x" son la misma etiqueta
+        enviadas = [e.strip().replace("W/", "", 1) for e in request.headers.get("if-none-match", "").split(",")]
+        if etag.replace("W/", "", 1) in enviadas or "*" in enviadas:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    resultado = generar()
+    if etag is not None:
+        cabeceras = resultado.headers if isinstance(resultado, Response) else response.headers
+        cabeceras["ETag"] = etag
+        cabeceras["Cache-Control"] = "no-cache"
+    return resultado
+
+def respuesta_ndjson(filas, lote: int = 256) -> StreamingResponse:
+    def lineas():
+        while True:
+            bloque = [dumps(fila) for fila in islice(filas, lote)]
+            if not bloque:
+                break
+            yield b"\n".join(bloque) + b"\n"
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
 
 # Endpoints para dueños
 @app.get("/duenos/")
-def get_duenos():
+def get_duenos(request: Request, response: Response, paginacion: Paginacion = Depends(),
+               nombre_dueno: Optional[str] = None):
     try:
-        # Verificar si el archivo existe
-        if not os.path.exists("registroDuenos.csv"):
-            return {"duenos": []}  # Devolver lista vacía si no hay archivo
-        
-        return dueno_repository.get_all()
+        return condicional(request, response, dueno_repository.version(), lambda: listar(
+            dueno_repository, paginacion, {"nombre_dueno": nombre_dueno}))
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error al obtener dueños: {str(e)}")  # Agregar logging
         return {"duenos": []}  # Devolver lista vacía en caso de error
@@ -199,15 +847,17 @@ def get_duenos():
 @app.post("/alta_duenos/")
 async def alta_dueno(data: Dueno):
     try:
-        dueno_repository.add(data)
+        await en_hilo(dueno_repository.add, data)
         return {"message": "Dueño registrado correctamente"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar los datos: {e}")
 
 @app.delete("/duenos/{dni_dueno}")
 async def dar_baja_dueno(dni_dueno: str):
     try:
-        dueno_repository.delete(dni_dueno)
+        await en_hilo(dueno_repository.delete, dni_dueno)
         return {"message": f"Dueño con DNI {dni_dueno} eliminado correctamente"}
     except HTTPException as e:
         raise e
@@ -217,52 +867,86 @@ async def dar_baja_dueno(dni_dueno: str):
 @app.get("/duenos/{dni_dueno}") 
 async def buscar_dueno(dni_dueno: str): 
     try:
-        duenos = dueno_repository.get_all()
-        dueno = next((dueno for dueno in duenos if dueno['dni_dueno'].strip() == dni_dueno.strip()), None)
+        dueno = await en_hilo(dueno_repository.get, dni_dueno)
         if dueno is None:
             raise HTTPException(status_code=404, detail="Dueño no encontrado.")
         return dueno
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error inesperado al buscar dueño: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error inesperado al buscar dueño: {str(e)}")
 
+def expediente_dueno(dni_dueno: str) -> Optional[dict]:
+    if ALMACENAMIENTO == "sql":
+        return dueno_repository.expediente(dni_dueno)
+    # CSV: el dueño por el índice del almacén; sus animales, facturas y citas
+    # por los índices por dueño de cada repositorio, sin recorrer las filas
+    dueno = dueno_repository.get(dni_dueno)
+    if dueno is None:
+        return None
+    _, animales = animal_repository.find({"dni_dueno": dueno["dni_dueno"]})
+    _, facturas = factura_repository.find({"nombre_dueno": dueno["nombre_dueno"]})
+    _, citas = cita_repository.find({"nombre_dueno": dueno["nombre_dueno"]})
+    return nuevo_expediente(dueno, animales, facturas, citas)
+
+@app.get("/duenos/{dni_dueno}/expediente")
+async def expediente(dni_dueno: str):
+    # Ficha completa del dueño (animales, facturas, citas y total facturado)
+    # en una sola petición
+    try:
+        datos = await en_hilo(expediente_dueno, dni_dueno)
+        if datos is None:
+            raise HTTPException(status_code=404, detail="Dueño no encontrado.")
+        return datos
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logging.error(f"Error inesperado al obtener el expediente: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error inesperado al obtener el expediente: {str(e)}")
+
 # Endpoints para animales
 @app.get("/animales/")
-def get_animales():
+def get_animales(request: Request, response: Response, paginacion: Paginacion = Depends(),
+                 especie_animal: Optional[str] = None, dni_dueno: Optional[str] = None,
+                 sexo: Optional[str] = None, desde: Optional[Union[datetime, date]] = None,
+                 hasta: Optional[Union[datetime, date]] = None):
     try:
-        return animal_repository.get_all()
+        filtros = {"especie_animal": especie_animal, "dni_dueno": dni_dueno, "sexo": sexo}
+        return condicional(request, response, animal_repository.version(), lambda: listar(
+            animal_repository, paginacion, filtros, desde, hasta))
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los animales: {str(e)}")
 
 @app.get("/animales/{chip_animal}")
 async def buscar_animal(chip_animal: str):
     try:
-        animales = animal_repository.get_all()
-        print(f"Animales actuales: {animales}")  # Para depuración
-        print(f"Buscando animal con chip: {chip_animal}")  # Para depuración
-        animal = next((a for a in animales if str(a['chip_animal']).strip() == chip_animal.strip()), None)
+        animal = await en_hilo(animal_repository.get, chip_animal)
         if animal is None:
             raise HTTPException(status_code=404, detail="Animal no encontrado.")
         return animal
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        print(f"Error al buscar animal: {str(e)}")  # Imprimir el error
+        logging.error(f"Error inesperado al buscar animal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error inesperado al buscar animal: {str(e)}")
 
 @app.post("/alta_animal/")
 async def alta_animal(data: Animal):
     try:
         data.fecha_alta = datetime.now()
-        animal_repository.add(data)
+        await en_hilo(animal_repository.add, data)
         return {"message": "Animal registrado correctamente"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar los datos: {e}")
 
 @app.delete("/animales/{chip_animal}")
 def eliminar_animal(chip_animal: str):
     try:
-        print(f"Intentando eliminar animal con chip: {chip_animal}")
-        animales = animal_repository.get_all()
-        print(f"Animales actuales: {animales}")
         animal_repository.delete(chip_animal)
         return {"detail": "Animal eliminado exitosamente"}
     except HTTPException as e:
@@ -271,67 +955,98 @@ def eliminar_animal(chip_animal: str):
         raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
 
 # Endpoints para citas
-citas_db = []
-next_id = 1
-
+@app.get("/citas/disponibilidad")
+def disponibilidad_citas(inicio: datetime, fin: datetime):
+    if a_fecha(fin) <= a_fecha(inicio):
+        raise HTTPException(status_code=400, detail="El fin debe ser posterior al inicio")
+    try:
+        libres = cita_repository.consultas_libres(inicio, fin)
+        return {"inicio": inicio, "fin": fin, "consultas_libres": libres,
+                "disponible": bool(libres)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar la disponibilidad: {str(e)}")
 
 @app.get("/citas/")
-def get_citas():
+def get_citas(desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+              consulta: Optional[str] = None):
     try:
-        return citas_db  # Devuelve la lista de citas
+        # Con rango o consulta se usa el índice por intervalos
+        if desde is not None or hasta is not None or consulta is not None:
+            return RespuestaJSON(cita_repository.en_rango(desde, hasta, consulta))
+        return RespuestaJSON(cita_repository.get_all())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener las citas: {str(e)}")
 
 @app.post("/citas/", response_model=Cita)
 def crear_cita(cita: Cita):
-    global next_id
     try:
-        nueva_cita = {
-            "id": next_id,
-            "nombre_animal": cita.nombre_animal,
-            "nombre_dueno": cita.nombre_dueno,
-            "tratamiento": cita.tratamiento,
-            "fecha_inicio": cita.fecha_inicio,
-            "fecha_fin": cita.fecha_fin,
-            "consulta": cita.consulta
-        }
-        citas_db.append(nueva_cita)
-        next_id += 1
-        return nueva_cita
+        return cita_repository.add(cita)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear la cita: {str(e)}")
 
 @app.put("/citas/{cita_id}")
 def modificar_cita(cita_id: int, cita_actualizada: dict):
-    global citas_db
-    for index, cita in enumerate(citas_db):
-        if cita["id"] == cita_id:
-            citas_db[index] = cita_actualizada
-            return {"detail": "Cita actualizada exitosamente"}
-    raise HTTPException(status_code=404, detail="Cita no encontrada")
+    datos = {campo: valor for campo, valor in cita_actualizada.items() if campo in Cita.__fields__}
+    try:
+        actualizada = cita_repository.update(cita_id, datos)
+    except ValidationError as e:
+        # La cita resultante se valida en el repositorio: 422 como en el alta
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors()))
+    if actualizada is None:
+        raise HTTPException(status_code=404, detail="Cita no encontrada")
+    return {"detail": "Cita actualizada exitosamente"}
 
 @app.delete("/citas/{cita_id}")
 def eliminar_cita(cita_id: int):
-    global citas_db
-    citas_db = [cita for cita in citas_db if cita["id"] != cita_id]
+    if not cita_repository.delete(cita_id):
+        raise HTTPException(status_code=404, detail="Cita no encontrada")
     return {"detail": "Cita eliminada exitosamente"}
 
+# Estadísticas del panel: recuentos mantenidos por los repositorios, en lugar
+# de descargar las tablas completas para contarlas en el cliente
+@app.get("/stats/")
+def get_stats(desde: Optional[date] = None, hasta: Optional[date] = None):
+    try:
+        repositorios = {"duenos": dueno_repository, "animales": animal_repository,
+                        "citas": cita_repository, "tratamientos": tratamiento_repository}
+        return {nombre: repository.estadisticas(desde, hasta) for nombre, repository in repositorios.items()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular las estadísticas: {str(e)}")
+
+def importe_valido(factura: dict) -> dict:
+    if "importe_con_iva" in factura:
+        factura = dict(factura, importe_con_iva=a_importe(factura["importe_con_iva"]))
+    return factura
+
 # Endpoint para recuperar datos de contratos
 @app.get("/retrieve_data/")
-def retrieve_data():
+def retrieve_data(request: Request, response: Response,
+                  formato: str = Query("json", regex="^(json|ndjson)$")):
+    def generar():
+        if formato == "ndjson":
+            # Una línea por contrato, serializada por bloques
+            return StreamingResponse(contratos.ndjson(), media_type="application/x-ndjson")
+        # Respuesta ya interpretada y serializada en memoria (importes
+        # numéricos, fechas ISO)
+        return Response(content=contratos.json(), media_type="application/json")
     try:
-        todosmisdatos = pd.read_csv('./contratos_inscritos_simplificado_2023.csv', sep=';')
-        todosmisdatos = todosmisdatos.fillna(0)
-        todosmisdatosdict = todosmisdatos.to_dict(orient='records')
-        return {"contratos": todosmisdatosdict}
+        return condicional(request, response, contratos.version(), generar)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al recuperar datos: {str(e)}")
 
 # Endpoint para obtener los tratamientos:
 @app.get("/tratamientos/")
-def get_tratamientos():
+def get_tratamientos(request: Request, response: Response, paginacion: Paginacion = Depends(),
+                     nombre_tratamiento: Optional[str] = None, desde: Optional[Union[datetime, date]] = None,
+                     hasta: Optional[Union[datetime, date]] = None):
     try:
-        return tratamiento_repository.get_all()
+        filtros = {"nombre_tratamiento": nombre_tratamiento}
+        return condicional(request, response, tratamiento_repository.version(), lambda: listar(
+            tratamiento_repository, paginacion, filtros, desde, hasta))
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los tratamientos: {str(e)}")
     
@@ -339,72 +1054,123 @@ def get_tratamientos():
 @app.post("/alta_tratamiento/")
 async def alta_tratamiento(data: Tratamiento):
     try:
-        tratamiento_repository.add(data)
+        await en_hilo(tratamiento_repository.add, data)
         return {"message": "Tratamiento registrado correctamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar los datos: {e}")
 
 # Endpoint para obtener todas las facturas:
 @app.get("/facturas/")
-def get_facturas():
+def get_facturas(paginacion: Paginacion = Depends(),
+                 nombre_dueno: Optional[str] = None, nombre_animal: Optional[str] = None,
+                 tratamiento: Optional[str] = None, desde: Optional[Union[datetime, date]] = None,
+                 hasta: Optional[Union[datetime, date]] = None):
     try:
-        df = factura_repository.get_all()
-        # Convertir a DataFrame
-        df_facturas = pd.DataFrame(df)
-        
-        # Asegurarse de que los valores sean válidos
-        df_facturas['importe_con_iva'] = pd.to_numeric(df_facturas['importe_con_iva'], errors='coerce').fillna(0)
-        
-        # Eliminar filas con valores no válidos
-        df_facturas = df_facturas.dropna()
-        
-        return df_facturas.to_dict(orient="records")
+        filtros = {"nombre_dueno": nombre_dueno, "nombre_animal": nombre_animal, "tratamiento": tratamiento}
+        # Asegurarse de que los importes sean válidos (solo en las filas devueltas)
+        return listar(factura_repository, paginacion, filtros, desde, hasta,
+                      transformar=importe_valido)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener las facturas: {str(e)}")
     
 @app.post("/alta_factura/")
-async def alta_factura(data: Factura):
+def alta_factura(data: Factura):
+    # Síncrono: cada petición espera en su hilo a que el escritor vuelque su
+    # lote, sin bloquear el bucle de eventos para las demás
     try:
         # Agregar la factura al repositorio
         factura_repository.add(data.dict())  # Asegúrate de convertir a dict
         return {"message": "Factura registrada correctamente"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar la factura: {e}")
+
+@app.post("/facturas/batch")
+def alta_facturas(facturas: List[Factura]):
+    # Cierre del día: todas las facturas en una sola escritura duradera
+    try:
+        factura_repository.add_many([factura.dict() for factura in facturas])
+        return {"message": "Facturas registradas correctamente", "facturas": len(facturas)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar las facturas: {e}")
     
 # Endpoint para el beneficio 
 @app.get("/beneficio_neto/")
-def get_beneficio_neto():
+def get_beneficio_neto(desglose: bool = False):
     try:
-        # Cargar los datos de facturas
-        df_facturas = pd.read_csv('registroFacturas.csv')
-        df_facturas['importe_con_iva'] = df_facturas['importe_con_iva'].astype(float)
-
-        # Definir gastos fijos
-        gastos_fijos = 10  # Gastos fijos por factura
-
-        # Calcular el beneficio neto
-        df_facturas['beneficio_neto'] = df_facturas['importe_con_iva'] - gastos_fijos  # Restar gastos fijos a cada factura
-        beneficio_neto_total = df_facturas['beneficio_neto'].sum()  # Sumar todos los beneficios netos
+        # Totales mantenidos en cada alta de factura, sin releer las facturas
+        totales = factura_repository.totales(desglose)
 
-        return {"beneficio_neto": beneficio_neto_total}
+        # Restar los gastos fijos de cada factura
+        respuesta = {"beneficio_neto": round(totales["importe"] - GASTOS_FIJOS_FACTURA * totales["facturas"], 2)}
+        if desglose:
+            for grupo in ("por_dia", "por_mes", "por_tratamiento"):
+                respuesta[grupo] = {clave: round(t["importe"] - GASTOS_FIJOS_FACTURA * t["facturas"], 2)
+                                    for clave, t in totales[grupo].items()}
+        return respuesta
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al calcular el beneficio neto: {str(e)}")
     
 
 @app.get("/facturacion_total/")
-def get_facturacion_total():
+def get_facturacion_total(desglose: bool = False):
     try:
-        # Cargar los datos de facturas
-        df_facturas = pd.read_csv('registroFacturas.csv')
-        df_facturas['importe_con_iva'] = df_facturas['importe_con_iva'].astype(float)
+        # Totales mantenidos en cada alta de factura, sin releer las facturas
+        totales = factura_repository.totales(desglose)
 
-        # Calcular la facturación total
-        facturacion_total = df_facturas['importe_con_iva'].sum()
-
-        return {"facturacion_total": facturacion_total}
+        respuesta = {"facturacion_total": totales["importe"], "facturas": totales["facturas"]}
+        if desglose:
+            for grupo in ("por_dia", "por_mes", "por_tratamiento"):
+                respuesta[grupo] = totales[grupo]
+        return respuesta
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al calcular la facturación total: {str(e)}")
+
+@app.post("/facturacion/recalcular/")
+def recalcular_facturacion():
+    # Reconstruye los totales desde el origen (CSV o base de datos)
+    try:
+        factura_repository.recalcular_totales()
+        return get_facturacion_total()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al recalcular la facturación: {str(e)}")
     
+# Métricas en el formato de texto de Prometheus
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metricas.texto(), media_type="text/plain; version=0.0.4")
+
+# Perfilado por muestreo del servidor en marcha, con la carga real. Devuelve
+# las pilas en formato "folded" (flamegraph.pl, speedscope):
+#   curl -X POST -H "X-Admin-Token: $CLINICA_PERFILADO_TOKEN" \
+#        "http://localhost:8000/debug/profile?segundos=10" > perfil.folded
+@app.post("/debug/profile")
+async def perfilar(segundos: float = Query(10, gt=0, le=60),
+                   intervalo_ms: float = Query(5, ge=1, le=100),
+                   inactivos: bool = False,
+                   x_admin_token: Optional[str] = Header(None)):
+    if not PERFILADO_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), PERFILADO_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administración no válido")
+    muestreador = Muestreador(intervalo_ms / 1000, inactivos)
+    if not muestreador.iniciar():
+        raise HTTPException(status_code=409, detail="Ya hay un perfilado en curso")
+    # El muestreo corre en su propio hilo; aquí solo se espera, sin ocupar
+    # un hilo del servidor ni parar el bucle de eventos
+    try:
+        await anyio.sleep(segundos)
+    finally:
+        muestreador.detener()
+    return PlainTextResponse(muestreador.plegado(), headers={
+        "Content-Disposition": 'attachment; filename="perfil.folded"',
+        "X-Muestras": str(muestreador.muestras)})
+
 # Endpoint para enviar formulario
 class FormData(BaseModel):
     date: str
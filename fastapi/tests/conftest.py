@@ -0,0 +1,38 @@
+import importlib
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Las pruebas se ejecutan desde fastapi/ (python -m pytest tests): server y
+# data se importan igual que al arrancar el servidor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from data.model import Base
+
+# Este directorio tiene __init__.py y pytest lo importaría como el paquete
+# "fastapi" al preparar las pruebas; con el de verdad ya cargado lo reutiliza
+import fastapi.testclient  # noqa: E402,F401
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    # El servidor abre sus CSV (backend por defecto) en el directorio actual:
+    # uno temporal para no tocar los datos de la clínica
+    anterior = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("csv"))
+    try:
+        yield importlib.import_module("server")
+    finally:
+        os.chdir(anterior)
+
+
+@pytest.fixture
+def sesiones(tmp_path):
+    # Base SQLite vacía con el esquema de data/model.py
+    engine = create_engine(f"sqlite:///{tmp_path / 'clinica.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
@@ -0,0 +1,70 @@
+import multiprocessing
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from data.model import Base
+
+CITA = {"nombre_animal": "Toby", "nombre_dueno": "Ana", "tratamiento": "Vacunación",
+        "fecha_inicio": "2024-01-01T10:00:00", "fecha_fin": "2024-01-01T10:30:00"}
+
+
+@pytest.fixture(params=["csv", "sql"])
+def citas(request, server, sesiones, tmp_path, monkeypatch):
+    if request.param == "sql":
+        repositorio = server.SQLCitaRepository(sesiones)
+    else:
+        repositorio = server.CitaRepository(str(tmp_path / "citas.csv"))
+    monkeypatch.setattr(server, "cita_repository", repositorio)
+    yield repositorio
+    repositorio.close()
+
+
+def test_modificar_cita_con_datos_no_validos(server, citas):
+    cliente = TestClient(server.app)
+    cita = cliente.post("/citas/", json=CITA).json()
+    respuesta = cliente.put(f"/citas/{cita['id']}", json={"fecha_inicio": "no-fecha"})
+    assert respuesta.status_code == 422
+    assert [error["loc"] for error in respuesta.json()["detail"]] == [["fecha_inicio"]]
+    assert server.a_fecha(citas.get(cita["id"])["fecha_inicio"]) == server.a_fecha(cita["fecha_inicio"])
+
+
+def reservar(server, url, barrera, resultados):
+    # Un worker: su propio proceso, motor y repositorio sobre la misma base
+    comprobar = server.reservar_consulta
+
+    def despacio(*args):
+        # Ensancha el intervalo entre la comprobación del hueco y el alta
+        consulta = comprobar(*args)
+        time.sleep(0.3)
+        return consulta
+
+    server.reservar_consulta = despacio
+    repositorio = server.SQLCitaRepository(sessionmaker(bind=create_engine(url)))
+    barrera.wait()
+    try:
+        resultados.put(repositorio.add(server.Cita(**CITA, consulta="A"))["id"])
+    except HTTPException as e:
+        resultados.put(e.status_code)
+
+
+def test_reserva_simultanea_desde_dos_workers(server, tmp_path):
+    url = f"sqlite:///{tmp_path / 'clinica.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    # fork (como los workers de uvicorn en Linux): el hijo parte del servidor ya importado
+    contexto = multiprocessing.get_context("fork")
+    barrera = contexto.Barrier(2)
+    resultados = contexto.Queue()
+    workers = [contexto.Process(target=reservar, args=(server, url, barrera, resultados))
+               for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert sorted(resultados.get(timeout=1) for _ in workers) == [1, 409]
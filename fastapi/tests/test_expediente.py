@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(params=["csv", "sql"])
+def clinica(request, server, sesiones, tmp_path, monkeypatch):
+    # Repositorios de dueños, animales, facturas y citas del backend indicado
+    if request.param == "sql":
+        repositorios = {"dueno": server.SQLDuenoRepository(sesiones), "animal": server.SQLAnimalRepository(sesiones),
+                        "factura": server.SQLFacturaRepository(sesiones), "cita": server.SQLCitaRepository(sesiones)}
+    else:
+        repositorios = {"dueno": server.DuenoRepository(str(tmp_path / "duenos.csv")),
+                        "animal": server.AnimalRepository(str(tmp_path / "animales.csv")),
+                        "factura": server.FacturaRepository(str(tmp_path / "facturas.csv")),
+                        "cita": server.CitaRepository(str(tmp_path / "citas.csv"))}
+    monkeypatch.setattr(server, "ALMACENAMIENTO", request.param)
+    for nombre, repositorio in repositorios.items():
+        monkeypatch.setattr(server, f"{nombre}_repository", repositorio)
+    yield TestClient(server.app)
+    for repositorio in repositorios.values():
+        repositorio.close()
+
+
+def test_cita_que_cambia_de_dueno(clinica):
+    for dni, nombre, animal in [("1A", "Ana", "Toby"), ("2B", "Berta", "Luna")]:
+        assert clinica.post("/alta_duenos/", json={
+            "nombre_dueno": nombre, "email_dueno": f"{nombre}@example.com", "dni_dueno": dni,
+            "direccion_dueno": "Calle Mayor 1"}).status_code == 200
+        assert clinica.post("/alta_animal/", json={
+            "nombre_animal": animal, "chip_animal": f"chip-{dni}", "especie_animal": "Perro",
+            "nacimiento_animal": "2020-01-01", "sexo": "M", "dni_dueno": dni}).status_code == 200
+    cita = clinica.post("/citas/", json={
+        "nombre_animal": "Toby", "nombre_dueno": "Ana", "tratamiento": "Vacunación",
+        "fecha_inicio": "2024-01-01T10:00:00", "fecha_fin": "2024-01-01T10:30:00"}).json()
+    assert [c["id"] for c in clinica.get("/duenos/1A/expediente").json()["citas"]] == [cita["id"]]
+
+    clinica.put(f"/citas/{cita['id']}", json={"nombre_dueno": "Berta", "nombre_animal": "Luna"})
+    assert clinica.get("/duenos/1A/expediente").json()["citas"] == []
+    citas = clinica.get("/duenos/2B/expediente").json()["citas"]
+    assert [(c["id"], c["nombre_dueno"], c["nombre_animal"]) for c in citas] == [(cita["id"], "Berta", "Luna")]
@@ -0,0 +1,22 @@
+def animal(server, chip, dni):
+    return server.Animal(nombre_animal=f"Animal {chip}", chip_animal=chip, especie_animal="Perro",
+                         nacimiento_animal="2020-01-01", sexo="M", dni_dueno=dni)
+
+
+def test_animales_de_un_dueno_por_el_indice(server, tmp_path):
+    fichero = str(tmp_path / "animales.csv")
+    repositorio = server.AnimalRepository(fichero)
+    otro = server.AnimalRepository(fichero)
+    try:
+        for chip, dni in [("001", "1A"), ("002", "2B"), ("003", "1A")]:
+            repositorio.add(animal(server, chip, dni))
+        repositorio.delete("001")
+        # Otro worker ve las altas y bajas del primero al releer el fichero
+        otro.add(animal(server, "004", "1A"))
+        for r in (repositorio, otro):
+            total, filas = r.find({"dni_dueno": " 1A "})
+            assert (total, [fila["chip_animal"] for fila in filas]) == (2, ["003", "004"])
+            assert r.find({"dni_dueno": "1A", "especie_animal": "Gato"}) == (0, [])
+    finally:
+        repositorio.close()
+        otro.close()
@@ -0,0 +1,8 @@
+from fastapi.testclient import TestClient
+
+
+def test_token_no_ascii_se_rechaza(server, monkeypatch):
+    monkeypatch.setattr(server, "PERFILADO_TOKEN", "secreto")
+    cliente = TestClient(server.app)
+    respuesta = cliente.post("/debug/profile", headers={"X-Admin-Token": "contraseña".encode("utf-8")})
+    assert respuesta.status_code == 403
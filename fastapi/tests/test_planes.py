@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine
+
+from data import migrar_indices, model
+from data.model import Base
+
+
+def test_las_consultas_de_los_repositorios_usan_sus_indices(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'clinica.db'}")
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn, conn.begin() as transaccion:
+        # El dueño de las consultas de PLANES: con él se ejecutan también las
+        # búsquedas que dependen de encontrarlo (enlace, expediente)
+        conn.execute(model.Dueno.__table__.insert(), {
+            "nombre_dueno": "Dueño 1", "email_dueno": "dueno1@example.com", "dni_dueno": "00000001R",
+            "direccion_dueno": "Calle Mayor 1", "telefono_dueno": "600000001"})
+        resultados = migrar_indices.planes(conn)
+        transaccion.rollback()
+    engine.dispose()
+    assert [(descripcion, explicados) for descripcion, explicados, usa_indice in resultados if not usa_indice] == []
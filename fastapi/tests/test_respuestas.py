@@ -0,0 +1,15 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from data import respuestas
+
+
+def test_sin_orjson_los_nan_se_envian_como_null(monkeypatch):
+    contenido = {"importe": float("nan"), "filas": [(np.float32("nan"), float("inf"), 1.5)],
+                 "fecha": pd.NaT, "dia": date(2024, 1, 1)}
+    con_orjson = respuestas.dumps(contenido)
+    monkeypatch.setattr(respuestas, "orjson", None)
+    assert respuestas.dumps(contenido) == con_orjson == \
+        b'{"importe":null,"filas":[[null,null,1.5]],"fecha":null,"dia":"2024-01-01"}'
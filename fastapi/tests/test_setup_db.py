@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine, text
+
+from data.setup_db import cargar
+
+
+def test_dni_repetido_no_aborta_la_carga(tmp_path):
+    (tmp_path / "registroDuenos.csv").write_text(
+        "nombre_dueno,telefono_dueno,email_dueno,dni_dueno,direccion_dueno\n"
+        "Ana,600000001,ana@example.com,1A,Calle Mayor 1\n"
+        "Berta,600000002,berta@example.com,2B,Calle Mayor 2\n"
+        "Ana bis,600000003,ana2@example.com,1A,Calle Mayor 3\n", encoding="utf-8")
+    url = f"sqlite:///{tmp_path / 'clinica.db'}"
+    total, descartadas, _ = cargar(url, str(tmp_path))["Duenos"]
+    assert (total, descartadas) == (2, 1)
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        # La primera, como en las búsquedas del backend CSV
+        assert conn.execute(text("SELECT nombre_dueno FROM Duenos WHERE dni_dueno = '1A'")).all() == [("Ana",)]
+    engine.dispose()
@@ -0,0 +1,13 @@
+from datetime import datetime
+
+
+def test_tratamientos_en_la_base_de_datos(server, sesiones):
+    repositorio = server.SQLTratamientoRepository(sesiones)
+    for nombre, importe, fecha in [("Vacunación", 30.25, "2024-01-10T10:00:00"),
+                                   ("Análisis", 60.5, "2024-02-10T10:00:00")]:
+        repositorio.add(server.Tratamiento(nombre_tratamiento=nombre, importe_con_iva=importe, fecha=fecha))
+    total, filas = repositorio.find(None, datetime(2024, 2, 1), datetime(2024, 3, 1))
+    assert (total, filas) == (1, [{"id": 2, "nombre_tratamiento": "Análisis", "importe_con_iva": 60.5,
+                                   "fecha": datetime(2024, 2, 10, 10, 0)}])
+    with sesiones() as session:
+        assert session.get(server.model.Tratamiento, 2).precio_sin_iva == 50.0
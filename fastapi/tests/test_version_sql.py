@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+
+def alta(repositorio, server, dni, nombre):
+    repositorio.add(server.Dueno(nombre_dueno=nombre, email_dueno=f"{nombre}@example.com",
+                                 dni_dueno=dni, direccion_dueno="Calle Mayor 1"))
+
+
+def test_baja_del_ultimo_y_alta_cambian_el_etag(server, sesiones, monkeypatch):
+    # SQLite reutiliza el id más alto tras borrarlo: mismo número de filas y
+    # mismo id máximo, pero otro contenido
+    repositorio = server.SQLDuenoRepository(sesiones)
+    monkeypatch.setattr(server, "dueno_repository", repositorio)
+    cliente = TestClient(server.app)
+    alta(repositorio, server, "1A", "Ana")
+    alta(repositorio, server, "2B", "Berta")
+
+    etag = cliente.get("/duenos/").headers["ETag"]
+    assert cliente.get("/duenos/", headers={"If-None-Match": etag}).status_code == 304
+
+    repositorio.delete("2B")
+    alta(repositorio, server, "3C", "Carmen")
+    respuesta = cliente.get("/duenos/", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert [dueno["dni_dueno"] for dueno in respuesta.json()] == ["1A", "3C"]
+    assert respuesta.headers["ETag"] != etag
+
+
+def test_version_compartida_entre_repositorios(server, sesiones):
+    # Dos workers sobre la misma base: la escritura de uno cambia la versión
+    # que ve el otro
+    uno = server.SQLCitaRepository(sesiones)
+    otro = server.SQLCitaRepository(sesiones)
+    version = otro.version()
+    cita = uno.add(server.Cita(nombre_animal="Toby", nombre_dueno="Ana", tratamiento="Vacunación",
+                               fecha_inicio="2024-01-01T10:00:00", fecha_fin="2024-01-01T10:30:00"))
+    assert otro.version() != version
+
+    version = otro.version()
+    uno.update(cita["id"], {"tratamiento": "Análisis"})
+    assert otro.version() != version
+
+    version = otro.version()
+    assert not uno.delete(cita["id"] + 1)
+    assert otro.version() == version
+    assert uno.delete(cita["id"])
+    assert otro.version() != version
+
+
+def test_totales_de_facturacion_entre_workers(server, sesiones):
+    # Cada worker suma sus propias altas y recalcula al ver las de otro
+    uno = server.SQLFacturaRepository(sesiones)
+    otro = server.SQLFacturaRepository(sesiones)
+    factura = server.Factura(nombre_dueno="Ana", nombre_animal="Toby", tratamiento="Vacunación",
+                             importe_con_iva=30.25, fecha="2024-01-01T10:00:00").dict()
+    uno.add_many([factura, factura])
+    otro.add(factura)
+    try:
+        assert uno.totales() == otro.totales() == {"importe": 90.75, "facturas": 3}
+    finally:
+        uno.close()
+        otro.close()
@@ -0,0 +1,214 @@
+import os
+import threading
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Cliente HTTP compartido por todas las páginas.
+# Una única requests.Session por proceso de Streamlit (st.cache_resource), con
+# conexiones persistentes (keep-alive) a FastAPI, tiempos de espera y
+# reintentos de las peticiones idempotentes ante fallos de conexión o 502-504.
+# Las lecturas de listados y KPI se cachean durante TTL segundos
+# (st.cache_data), de modo que cada re-ejecución de una página no vuelve a
+# pedirlos; cualquier alta, cambio o baja vacía esa caché. Al volver a
+# pedirlos se envía el ETag de la última respuesta (If-None-Match): si la
+# colección no ha cambiado el servidor contesta 304 sin cuerpo y se reutiliza
+# el JSON ya descargado.
+
+API_URL = os.getenv("API_URL", "http://fastapi:8000").rstrip("/")
+TIMEOUT = (3.05, 30)  # (conexión, lectura) en segundos
+TTL = 60
+
+
+@st.cache_resource
+def sesion() -> requests.Session:
+    reintentos = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                       raise_on_status=False)
+    adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=reintentos)
+    s = requests.Session()
+    s.mount("http://", adaptador)
+    s.mount("https://", adaptador)
+    return s
+
+
+def url(ruta: str) -> str:
+    return f"{API_URL}/{ruta.lstrip('/')}"
+
+
+def get(ruta: str, params=None) -> requests.Response:
+    return sesion().get(url(ruta), params=params, timeout=TIMEOUT)
+
+
+class Validadas:
+    # Última respuesta con ETag de cada (ruta, parámetros), compartida por
+    # todas las sesiones; sobrevive a invalidar() para poder revalidarla
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._respuestas = {}
+
+    def get(self, clave):
+        with self._lock:
+            return self._respuestas.get(clave)
+
+    def guardar(self, clave, etag, datos):
+        with self._lock:
+            if etag:
+                self._respuestas[clave] = (etag, datos)
+            else:
+                self._respuestas.pop(clave, None)
+
+
+@st.cache_resource
+def validadas() -> Validadas:
+    return Validadas()
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def get_json(ruta: str, params=None):
+    # Lectura cacheada; los errores (HTTPError, conexión) no se cachean
+    clave = (ruta, tuple(sorted(params.items())) if params else ())
+    anterior = validadas().get(clave)
+    cabeceras = {"If-None-Match": anterior[0]} if anterior else None
+    respuesta = sesion().get(url(ruta), params=params, headers=cabeceras, timeout=TIMEOUT)
+    if respuesta.status_code == 304 and anterior:
+        return anterior[1]
+    respuesta.raise_for_status()
+    datos = respuesta.json()
+    validadas().guardar(clave, respuesta.headers.get("ETag"), datos)
+    return datos
+
+
+def post(ruta: str, json=None) -> requests.Response:
+    return _escribir("POST", ruta, json)
+
+
+def put(ruta: str, json=None) -> requests.Response:
+    return _escribir("PUT", ruta, json)
+
+
+def delete(ruta: str) -> requests.Response:
+    return _escribir("DELETE", ruta)
+
+
+def invalidar():
+    get_json.clear()
+
+
+def _escribir(metodo: str, ruta: str, json=None) -> requests.Response:
+    try:
+        return sesion().request(metodo, url(ruta), json=json, timeout=TIMEOUT)
+    finally:
+        invalidar()
+
+
+def _listar(ruta: str, fields: str, que: str) -> list:
+    try:
+        return get_json(ruta, {"fields": fields} if fields else None)
+    except requests.HTTPError as e:
+        st.error(f"Error al obtener {que}: {e.response.status_code} - {e.response.text}")
+    except requests.RequestException as e:
+        st.error(f"Error al obtener {que}: {e}")
+    return []
+
+
+def _buscar(ruta: str, no_existe: str) -> dict:
+    try:
+        return get_json(ruta)
+    except requests.HTTPError as e:
+        if e.response.status_code == 404:
+            return {"error": no_existe}
+        return {"error": f"Error al buscar los datos: {e.response.status_code}"}
+    except requests.RequestException as e:
+        return {"error": f"Error de conexión al buscar los datos: {e}"}
+
+
+def _dar_baja(ruta: str, no_existe: str):
+    try:
+        response = delete(ruta)
+        if response.status_code == 200:
+            return True, response.json()
+        elif response.status_code == 404:
+            return False, no_existe
+        else:
+            return False, f"Error al dar de baja: {response.status_code}, Detalle: {response.text}"
+    except requests.exceptions.RequestException as e:
+        return False, f"Error de conexión: {e}"
+
+
+def _alta(ruta: str, payload: dict):
+    try:
+        return post(ruta, payload)
+    except requests.exceptions.RequestException:
+        return None  # Error de conexión
+
+
+# Clase para manejar la lógica de los dueños
+class DuenoService:
+    def obtener_duenos(self, fields="nombre_dueno") -> list:
+        # Por defecto solo el campo que se muestra en los desplegables
+        return _listar("/duenos/", fields, "dueños")
+
+    def buscar(self, dni_dueno) -> dict:
+        return _buscar(f"/duenos/{dni_dueno}", "No existe dueño con el DNI introducido")
+
+    def dar_baja(self, dni_dueno):
+        return _dar_baja(f"/duenos/{dni_dueno}", "No existe un dueño con el DNI introducido.")
+
+    def alta(self, payload: dict):
+        return _alta("/alta_duenos/", payload)
+
+
+# Clase para manejar la lógica de los animales
+class AnimalService:
+    def obtener_animales(self, fields="nombre_animal") -> list:
+        return _listar("/animales/", fields, "animales")
+
+    def buscar(self, chip_animal) -> dict:
+        return _buscar(f"/animales/{chip_animal}", "No existe animal con el chip introducido")
+
+    def dar_baja(self, chip_animal):
+        return _dar_baja(f"/animales/{chip_animal}", "No existe un animal con el número de chip introducido.")
+
+    def alta(self, payload: dict):
+        return _alta("/alta_animal/", payload)
+
+
+# Clase para manejar la lógica de las citas
+class CitaService:
+    def send(self, data, method="POST", cita_id=None):
+        try:
+            ruta = "/citas/" if cita_id is None else f"/citas/{cita_id}"
+            if method == "POST":
+                response = post(ruta, data)
+            elif method == "PUT":
+                response = put(ruta, data)
+            elif method == "DELETE":
+                response = delete(ruta)
+            if response.status_code == 200:
+                return response.json() if method == "POST" else '200'
+            else:
+                return str(response.status_code)
+        except Exception as e:
+            return str(e)
+
+    def en_rango(self, desde: str, hasta: str) -> list:
+        # Citas que se solapan con [desde, hasta), cacheadas por rango
+        try:
+            return get_json("/citas/", {"desde": desde, "hasta": hasta})
+        except requests.RequestException as e:
+            st.error(f"Error al obtener las citas: {e}")
+            return []
+
+    def disponibilidad(self, inicio, fin):
+        # Consultas libres según el servidor (índice por intervalos de cada
+        # consulta). Sin caché: la respuesta cambia con cada reserva
+        try:
+            response = get("/citas/disponibilidad", {"inicio": inicio, "fin": fin})
+            if response.status_code == 200:
+                return response.json().get("consultas_libres", [])
+            st.error(f"Error al comprobar la disponibilidad: {response.status_code} - {response.text}")
+        except Exception as e:
+            st.error(f"Excepción al comprobar la disponibilidad: {e}")
+        return None
@@ -3,17 +3,20 @@ import streamlit as st
 import plotly.express as px
 import requests
 import seaborn as sns
-from datetime import datetime
+from datetime import datetime, timedelta
 import calendar
+import threading
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# URLs de los servicios backend
-url_animales = "http://fastapi:8000/animales/"
-url_duenos = "http://fastapi:8000/duenos/"
-url_citas = "http://fastapi:8000/citas/"
-url_contratos = "http://fastapi:8000/retrieve_data"
-url_beneficio = "http://fastapi:8000/beneficio_neto/"
-url_facturacion = "http://fastapi:8000/facturacion_total/"
+import cliente_api
+
+# Rutas de los servicios backend
+url_contratos = "/retrieve_data/"
+url_beneficio = "/beneficio_neto/"
+url_facturacion = "/facturacion_total/"
+url_stats = "/stats/"
 
 # Configuración de la página
 st.set_page_config(
@@ -22,8 +25,8 @@ st.set_page_config(
     layout="wide"
 )
 # Función para crear cajas de información con estilo mejorado
-def info_box(texto, icon="📊"):
-    st.markdown(f"""
+def info_box(texto, icon="📊", destino=st):
+    destino.markdown(f"""
         <div style="background: linear-gradient(135deg, #4EBAE1 0%, #3B9AC7 100%);
                     padding: 1.5rem;
                     border-radius: 10px;
@@ -64,47 +67,39 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+@st.cache_data(ttl=cliente_api.TTL)
 def load_data(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
+    # Con get_json: pasado el TTL se revalida por ETag y, si los contratos no
+    # han cambiado, no se vuelven a descargar
+    try:
+        mijson = cliente_api.get_json(url)
+    except requests.RequestException:
         return None
-    mijson = r.json()
     listado = mijson['contratos']
-    df = pd.DataFrame.from_records(listado)
-    df['importe_adj_con_iva'] = df['importe_adj_con_iva'].str.replace('€', '')
-    df['importe_adj_con_iva'] = df['importe_adj_con_iva'].str.replace('.', '')
-    df['importe_adj_con_iva'] = df['importe_adj_con_iva'].str.replace(',', '.')
-    df['presupuesto_con_iva'] = df['presupuesto_con_iva'].str.replace('€', '')
-    df['presupuesto_con_iva'] = df['presupuesto_con_iva'].str.replace('.', '')
-    df['presupuesto_con_iva'] = df['presupuesto_con_iva'].str.replace(',', '.')
-
-    df['presupuesto_con_iva'] = df['presupuesto_con_iva'].astype(float)
-    df['importe_adj_con_iva'] = df['importe_adj_con_iva'].astype(float)
-
-    return df
-
-def load_duenos(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()  # Devuelve la lista de dueños
-
-def load_animales(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()  # Devuelve la lista de animales
-
-# Cargar datos de animales desde el backend
-r = requests.get(url_animales)
-if r.status_code == 200:
-    animales_data = r.json()
-    df_animales = pd.DataFrame(animales_data)
-    if "fecha_alta" in df_animales.columns:
-        df_animales["fecha_alta"] = pd.to_datetime(df_animales["fecha_alta"])  # Asegurar datetime
-else:
-    df_animales = pd.DataFrame()  # Si no hay datos, crea un DataFrame vacío
+    # El servidor ya envía los importes como números y las fechas en ISO
+    return pd.DataFrame.from_records(listado)
+
+def load_json(url: str, params=None, defecto=None):
+    # Lecturas cacheadas por el cliente compartido (TTL, se invalidan con cada alta)
+    try:
+        return cliente_api.get_json(url, params)
+    except requests.RequestException:
+        return defecto if defecto is not None else {}
+
+def load_stats(url: str, desde, hasta):
+    # Recuentos calculados en el servidor: una sola petición pequeña
+    return load_json(url, {"desde": desde.date().isoformat(), "hasta": hasta.date().isoformat()})
+
+def en_paralelo(cargas: dict):
+    # Lanza todas las cargas a la vez y devuelve (nombre, resultado) según van
+    # llegando: la página tarda lo que la petición más lenta, no la suma. Los
+    # hilos llevan el contexto de la sesión para poder usar las cachés de Streamlit
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=len(cargas),
+                            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as pool:
+        futuros = {pool.submit(carga): nombre for nombre, carga in cargas.items()}
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
 
 # Detectar mes actual y rango de fechas
 today = datetime.now()
@@ -118,18 +113,64 @@ end_date = datetime(current_year, current_month, days_in_month)
 date_range = pd.date_range(start=start_date, end=end_date)
 df_full_dates = pd.DataFrame(date_range, columns=["fecha"])  # DataFrame con todas las fechas del mes
 
-# Procesar los datos reales
-if not df_animales.empty:
-    df_evolucion = df_animales.groupby(df_animales["fecha_alta"].dt.date).size().reset_index(name="total")
-    df_evolucion.rename(columns={"fecha_alta": "fecha"}, inplace=True)  # Asegurarnos del nombre
-    df_evolucion["fecha"] = pd.to_datetime(df_evolucion["fecha"])  # Convertir a datetime si es necesario
-else:
-    df_evolucion = pd.DataFrame(columns=["fecha", "total"])  # DataFrame vacío si no hay datos
-
-# Combinar el rango completo con los datos reales
-df_full_dates["fecha"] = pd.to_datetime(df_full_dates["fecha"])  # Asegurar datetime
-df_evolucion_full = pd.merge(df_full_dates, df_evolucion, on="fecha", how="left")
-df_evolucion_full["total"] = df_evolucion_full["total"].fillna(0)  # Rellenar días sin datos con 0
+def evolucion_altas(stats):
+    # Altas de animales por día del mes, con 0 en los días sin altas
+    altas_por_dia = stats.get("animales", {}).get("por_dia", {})
+    if altas_por_dia:
+        df_evolucion = pd.DataFrame(list(altas_por_dia.items()), columns=["fecha", "total"])
+        df_evolucion["fecha"] = pd.to_datetime(df_evolucion["fecha"])  # Convertir a datetime si es necesario
+    else:
+        df_evolucion = pd.DataFrame(columns=["fecha", "total"])  # DataFrame vacío si no hay datos
+
+    # Combinar el rango completo con los datos reales
+    df_full_dates["fecha"] = pd.to_datetime(df_full_dates["fecha"])  # Asegurar datetime
+    df_evolucion_full = pd.merge(df_full_dates, df_evolucion, on="fecha", how="left")
+    df_evolucion_full["total"] = df_evolucion_full["total"].fillna(0)  # Rellenar días sin datos con 0
+    return df_evolucion_full
+
+def grafico_evolucion(df_evolucion_full, destino):
+    # Gráfico de evolución con estilo mejorado
+    if not df_evolucion_full.empty:
+        fig = px.line(
+            df_evolucion_full,
+            x="fecha",
+            y="total",
+            labels={"fecha": "Fecha", "total": "Animales dados de alta"},
+            title=f"Evolución de Altas de Animales - {today.strftime('%B %Y')}"
+        )
+        fig.update_traces(line_color='#4EBAE1', line_width=3)
+        fig.update_layout(
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font={'color': '#2B4162', 'size': 12},
+            title={'font': {'size': 24, 'color': '#2B4162'}},
+            xaxis={'gridcolor': '#E1E5EA'},
+            yaxis={'gridcolor': '#E1E5EA'}
+        )
+        destino.plotly_chart(fig, use_container_width=True)
+
+def grafico_relacion(num_clientes_int, facturacion_total_value, destino):
+    # Crear un DataFrame para el gráfico
+    df_relacion = pd.DataFrame({
+        'Número de Clientes': [num_clientes_int],
+        'Facturación Total': [facturacion_total_value]
+    })
+
+    # Usar Plotly para crear un gráfico de dispersión
+    if not df_relacion.empty:
+        fig = px.scatter(
+            df_relacion, 
+            x='Número de Clientes', 
+            y='Facturación Total', 
+            title='Relación entre Facturación Total y Número de Clientes',
+            labels={'Número de Clientes': 'Número de Clientes', 'Facturación Total': 'Facturación Total (€)'},
+            size='Facturación Total',  # Tamaño de los puntos basado en la facturación
+            hover_name='Facturación Total'
+        )  # Mostrar la facturación al pasar el ratón
+        # Mostrar el gráfico en Streamlit
+        destino.plotly_chart(fig, use_container_width=True)
+    else:
+        destino.info("No hay datos disponibles para mostrar la relación entre clientes y facturación total.")
 
 # Contenedor principal para métricas
 st.markdown("""
@@ -143,80 +184,20 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Definir columnas con iconos específicos
-col1, col2, col3 = st.columns(3)
-col4, col5, col6 = st.columns(3)
-
-# Cargar datos de contratos
-df_merged = load_data('http://fastapi:8000/retrieve_data')
-
-# Cargar datos de dueños
-duenos_data = load_duenos('http://fastapi:8000/duenos/')
-num_clientes = str(len(duenos_data)) if duenos_data else "0"  # Contar dueños
-
-# Cargar datos de animales
-animales_data = load_animales('http://fastapi:8000/animales/')
-num_animales = str(len(animales_data)) if animales_data else "0"  # Contar animales
-
-# Asignar directamente el número de tratamientos
-num_tratamientos = "11"  # Número fijo de tratamientos
-
-# Llamar al endpoint para obtener el beneficio neto
-beneficio_neto_url = "http://fastapi:8000/beneficio_neto/"
-r_beneficio = requests.get(beneficio_neto_url)
-
-if r_beneficio.status_code == 200:
-    beneficio_neto_value = r_beneficio.json().get("beneficio_neto", 0)
-else:
-    beneficio_neto_value = 0  # Si no se puede obtener el beneficio, establecer en 0
-
-
-# Llamar al endpoint para obtener la facturación total
-facturacion_total_url = "http://fastapi:8000/facturacion_total/"
-r_facturacion = requests.get(facturacion_total_url)
-
-if r_facturacion.status_code == 200:
-    facturacion_total_value = r_facturacion.json().get("facturacion_total", 0)
-else:
-    facturacion_total_value = 0  # Si no se puede obtener la facturación, establecer en 0
-
-
-# Cargar datos de citas
-citas_url = "http://fastapi:8000/citas/"
-r_citas = requests.get(citas_url)
-
-if r_citas.status_code == 200:
-    citas_data = r_citas.json()
-    num_citas = len(citas_data)  # Número total de citas
-else:
-    num_citas = 0  # Si no se puede obtener, establecer en 0
-
-# Calcular ingreso promedio por cita
-ingreso_promedio_por_cita = facturacion_total_value / num_citas if num_citas > 0 else 0
-
-# Definir columnas
+# Definir columnas con iconos específicos. Cada caja se reserva ya en su sitio
+# y se rellena en cuanto llega el dato que necesita
 col1, col2, col3 = st.columns(3)
 col4, col5, col6 = st.columns(3)  # Definir columnas adicionales
-
-with col1:
-    col1.subheader('👥 Clientes')
-    info_box(num_clientes, "👥")
-with col2:
-    col2.subheader('💉 Tratamientos')
-    info_box(num_tratamientos, "💉")
-with col3:
-    col3.subheader('🐾 Animales')
-    info_box(num_animales, "🐾")
-
-with col4:
-    col4.subheader('💰 Beneficio Neto')
-    info_box(f'{beneficio_neto_value:,.2f} €', "💰")
-with col5:
-    col5.subheader('📈 Facturación Total')
-    info_box(f'{facturacion_total_value:,.2f} €', "📈")
-with col6:
-    col6.subheader('💊 Ingreso por Cita')
-    info_box(f'{ingreso_promedio_por_cita:,.2f} €', "💊")
+cajas = {}
+for clave, col, titulo, icono in [("clientes", col1, 'Clientes', "👥"),
+                                  ("tratamientos", col2, 'Tratamientos', "💉"),
+                                  ("animales", col3, 'Animales', "🐾"),
+                                  ("beneficio", col4, 'Beneficio Neto', "💰"),
+                                  ("facturacion", col5, 'Facturación Total', "📈"),
+                                  ("ingreso", col6, 'Ingreso por Cita', "💊")]:
+    col.subheader(f'{icono} {titulo}')
+    cajas[clave] = col.empty()
+    info_box("…", icono, cajas[clave])
 
 # Sección de gráficos con estilo mejorado
 st.markdown("""
@@ -232,50 +213,47 @@ st.markdown("""
 
 # Contenedor para gráficos
 with st.container():
-    # Gráfico de evolución con estilo mejorado
-    if not df_evolucion_full.empty:
-        fig = px.line(
-            df_evolucion_full,
-            x="fecha",
-            y="total",
-            labels={"fecha": "Fecha", "total": "Animales dados de alta"},
-            title=f"Evolución de Altas de Animales - {today.strftime('%B %Y')}"
-        )
-        fig.update_traces(line_color='#4EBAE1', line_width=3)
-        fig.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font={'color': '#2B4162', 'size': 12},
-            title={'font': {'size': 24, 'color': '#2B4162'}},
-            xaxis={'gridcolor': '#E1E5EA'},
-            yaxis={'gridcolor': '#E1E5EA'}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    hueco_evolucion = st.empty()
 
 # Crear el gráfico de relación entre facturación total y número de clientes
 st.header("Relación entre Facturación Total y Número de Clientes")
-
-# Convertir num_clientes a entero para el gráfico
-num_clientes_int = int(num_clientes)
-
-# Crear un DataFrame para el gráfico
-df_relacion = pd.DataFrame({
-    'Número de Clientes': [num_clientes_int],
-    'Facturación Total': [facturacion_total_value]
-})
-
-# Usar Plotly para crear un gráfico de dispersión
-if not df_relacion.empty:
-    fig = px.scatter(
-        df_relacion, 
-        x='Número de Clientes', 
-        y='Facturación Total', 
-        title='Relación entre Facturación Total y Número de Clientes',
-        labels={'Número de Clientes': 'Número de Clientes', 'Facturación Total': 'Facturación Total (€)'},
-        size='Facturación Total',  # Tamaño de los puntos basado en la facturación
-        hover_name='Facturación Total'
-    )  # Mostrar la facturación al pasar el ratón
-    # Mostrar el gráfico en Streamlit
-    st.plotly_chart(fig, use_container_width=True)
-else:
-    st.info("No hay datos disponibles para mostrar la relación entre clientes y facturación total.")
+hueco_relacion = st.empty()
+
+# Cargas del backend en paralelo: estadísticas del mes actual (recuentos y
+# altas por día), beneficio neto, facturación total y contratos
+datos = {}
+for nombre, resultado in en_paralelo({
+    "stats": lambda: load_stats(url_stats, start_date, end_date + timedelta(days=1)),
+    "beneficio": lambda: load_json(url_beneficio),
+    "facturacion": lambda: load_json(url_facturacion),
+    "contratos": lambda: load_data(url_contratos),
+}):
+    datos[nombre] = resultado
+
+    if nombre == "stats":
+        # Recuentos de dueños, animales y tratamientos
+        stats = resultado
+        info_box(str(stats.get("duenos", {}).get("total", 0)), "👥", cajas["clientes"])
+        info_box(str(stats.get("tratamientos", {}).get("total", 0)), "💉", cajas["tratamientos"])
+        info_box(str(stats.get("animales", {}).get("total", 0)), "🐾", cajas["animales"])
+        grafico_evolucion(evolucion_altas(stats), hueco_evolucion)
+    elif nombre == "beneficio":
+        # 0 si no se puede obtener el beneficio
+        beneficio_neto_value = resultado.get("beneficio_neto", 0)
+        info_box(f'{beneficio_neto_value:,.2f} €', "💰", cajas["beneficio"])
+    elif nombre == "facturacion":
+        # 0 si no se puede obtener la facturación
+        facturacion_total_value = resultado.get("facturacion_total", 0)
+        info_box(f'{facturacion_total_value:,.2f} €', "📈", cajas["facturacion"])
+
+    if nombre in ("stats", "facturacion") and "stats" in datos and "facturacion" in datos:
+        # Calcular ingreso promedio por cita (número total de citas de las estadísticas)
+        num_citas = stats.get("citas", {}).get("total", 0)
+        ingreso_promedio_por_cita = facturacion_total_value / num_citas if num_citas > 0 else 0
+        info_box(f'{ingreso_promedio_por_cita:,.2f} €', "💊", cajas["ingreso"])
+        # Convertir num_clientes a entero para el gráfico
+        num_clientes_int = int(stats.get("duenos", {}).get("total", 0))
+        grafico_relacion(num_clientes_int, facturacion_total_value, hueco_relacion)
+
+# Datos de contratos
+df_merged = datos["contratos"]
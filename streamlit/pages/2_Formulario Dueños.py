@@ -1,8 +1,9 @@
 import streamlit as st
-import requests
 import re
 import time
 
+from cliente_api import DuenoService
+
 # Clase para representar a un dueno
 class Dueno:
     def __init__(self, nombre, telefono, email, dni, direccion):
@@ -30,28 +31,6 @@ class Validador:
             return "El correo electrónico no tiene un formato válido."
         return None
 
-class DuenoService:
-    def __init__(self, url):
-        self.url = url
-
-    def guardar_datos(self, dueno):
-        # Aquí podrías enviar los datos a un microservicio
-        payload = {
-            "nombre_dueno": dueno.nombre,
-            "telefono_dueno": dueno.telefono,
-            "email_dueno": dueno.email,
-            "dni_dueno": dueno.dni,
-            "direccion_dueno": dueno.direccion
-        }
-        return self.enviar_datos(payload)
-
-    def enviar_datos(self, payload):
-        try:
-            response = requests.post(self.url, json=payload)
-            return response  # Devuelve la respuesta
-        except requests.exceptions.RequestException as e:
-            return None  # Devuelve None en caso de error
-
 def crear_formulario_duenos():
     # Estilo CSS personalizado
     st.markdown("""
@@ -70,8 +49,7 @@ def crear_formulario_duenos():
         </div>
     """, unsafe_allow_html=True)
 
-    url = "http://fastapi:8000/alta_duenos"  # Cambia esta URL según tu microservicio
-    dueno_service = DuenoService(url)
+    dueno_service = DuenoService()
 
     with st.form("registro_duenos"):
         st.subheader("Datos del dueño")
@@ -105,7 +83,13 @@ def crear_formulario_duenos():
                             st.write("👤👤👤👤👤 ¡Completado!")
                         time.sleep(0.5)
 
-                response = dueno_service.guardar_datos(dueno)
+                response = dueno_service.alta({
+                    "nombre_dueno": dueno.nombre,
+                    "telefono_dueno": dueno.telefono,
+                    "email_dueno": dueno.email,
+                    "dni_dueno": dueno.dni,
+                    "direccion_dueno": dueno.direccion
+                })
                 if response is not None and response.status_code == 200:
                     # Animación de éxito
                     success_placeholder = st.empty()
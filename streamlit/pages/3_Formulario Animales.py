@@ -1,11 +1,9 @@
 import streamlit as st
-import requests
 import re
 from datetime import datetime
 import time
 
-# URL del microservicio FastAPI
-url = "http://fastapi:8000/alta_animal"
+from cliente_api import AnimalService, DuenoService
 
 # Clase para representar a un animal
 class Animal:
@@ -35,31 +33,11 @@ class ValidadorAnimal:
             return "La especie del animal no debe contener números."
         return None
 
-# Clase para manejar el servicio de envío de datos
-class AnimalService:
-    def __init__(self, url):
-        self.url = url
-
-    def guardar_datos(self, animal):
-        payload = {
-            "nombre_animal": animal.nombre,
-            "chip_animal": animal.chip,
-            "especie_animal": animal.especie,
-            "nacimiento_animal": animal.nacimiento,
-            "sexo": animal.sexo,
-            "dni_dueno": animal.dni_dueno
-        }
-        try:
-            response = requests.post(self.url, json=payload)
-            return response
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
-
-
 # Clase para manejar la interfaz de usuario
 class FormularioAnimales:
     def __init__(self):
-        self.animal_service = AnimalService(url)
+        self.animal_service = AnimalService()
+        self.dueno_service = DuenoService()
 
     def crear_formulario(self):
         # Título con el nuevo formato
@@ -79,21 +57,12 @@ class FormularioAnimales:
             </div>
         """, unsafe_allow_html=True)
 
-        # Cargar datos de dueños
-        duenos_data = 'http://fastapi:8000/duenos/'
-        
         # Obtener la lista de dueños
-        response = requests.get(duenos_data)
-        if response.status_code == 200:
-            duenos = response.json()
-            # Crear un diccionario con todos los dueños
-            duenos_dict = {dueno['dni_dueno']: dueno['nombre_dueno'] 
-                       for dueno in duenos
-                       if 'dni_dueno' in dueno and 'nombre_dueno' in dueno}
-        
-        else:
-            st.error("Error al obtener los dueños.")
-            duenos_dict={}
+        duenos = self.dueno_service.obtener_duenos("dni_dueno,nombre_dueno")
+        # Crear un diccionario con todos los dueños
+        duenos_dict = {dueno['dni_dueno']: dueno['nombre_dueno'] 
+                   for dueno in duenos
+                   if 'dni_dueno' in dueno and 'nombre_dueno' in dueno}
 
         with st.form("registro_animales"):
             st.subheader("Datos del animal")
@@ -139,7 +108,14 @@ class FormularioAnimales:
                         st.write("👤👤👤👤👤 ¡Completado!")
                     time.sleep(0.5)
 
-            response = self.animal_service.guardar_datos(animal)
+            response = self.animal_service.alta({
+                "nombre_animal": animal.nombre,
+                "chip_animal": animal.chip,
+                "especie_animal": animal.especie,
+                "nacimiento_animal": animal.nacimiento,
+                "sexo": animal.sexo,
+                "dni_dueno": animal.dni_dueno
+            })
             if response is not None and response.status_code == 200:
                 # Animación de éxito
                     success_placeholder = st.empty()
@@ -1,40 +1,7 @@
 import streamlit as st
-import requests
 import time
 
-# Clase para manejar la lógica de la baja de dueños
-class DuenoService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def dar_baja(self, dni_dueno):
-        try:
-            response = requests.delete(f"{self.backend_url}/{dni_dueno}")
-            if response.status_code == 200:
-                return True, response.json()
-            elif response.status_code == 404:
-                return False, "No existe un dueño con el DNI introducido."
-            else:
-                return False, f"Error al dar de baja: {response.status_code}, Detalle: {response.text}"
-        except requests.exceptions.RequestException as e:
-            return False, f"Error de conexión: {e}"
-
-# Clase para manejar la lógica de la baja de animales
-class AnimalService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def dar_baja(self, chip_animal):
-        try:
-            response = requests.delete(f"{self.backend_url}/{chip_animal}")
-            if response.status_code == 200:
-                return True, response.json()
-            elif response.status_code == 404:
-                return False, "No existe un animal con el número de chip introducido."
-            else:
-                return False, f"Error al dar de baja: {response.status_code}, Detalle: {response.text}"
-        except requests.exceptions.RequestException as e:
-            return False, f"Error de conexión: {e}"
+from cliente_api import AnimalService, DuenoService
 
 # Clase para manejar la interfaz de usuario
 class BajaInterface:
@@ -157,11 +124,8 @@ class BajaInterface:
         """, unsafe_allow_html=True)
 
 # Inicialización de servicios y la interfaz
-duenos_backend = "http://fastapi:8000/duenos"
-animales_backend = "http://fastapi:8000/animales"
-
-dueno_service = DuenoService(duenos_backend)
-animal_service = AnimalService(animales_backend)
+dueno_service = DuenoService()
+animal_service = AnimalService()
 baja_interface = BajaInterface(dueno_service, animal_service)
 
 # Mostrar interfaz
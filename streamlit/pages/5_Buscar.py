@@ -1,40 +1,7 @@
-import requests
 import streamlit as st
 import time
 
-# Clase para manejar la lógica de búsqueda de dueños
-class DuenoService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def buscar(self, dni_dueno):
-        try:
-            response = requests.get(f"{self.backend_url}/{dni_dueno}")
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                return {"error": "No existe dueño con el DNI introducido"}
-            else:
-                return {"error": f"Error al buscar los datos: {response.status_code}"}
-        except requests.exceptions.RequestException as e:
-            return {"error": f"Error de conexión al buscar los datos: {e}"}
-
-# Clase para manejar la lógica de búsqueda de animales
-class AnimalService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def buscar(self, chip_animal):
-        try:
-            response = requests.get(f"{self.backend_url}/{chip_animal}")
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                return {"error": "No existe animal con el chip introducido"}
-            else:
-                return {"error": f"Error al buscar los datos: {response.status_code}"}
-        except requests.exceptions.RequestException as e:
-            return {"error": f"Error de conexión al buscar los datos: {e}"}
+from cliente_api import AnimalService, DuenoService
 
 # Clase para manejar la interfaz de usuario
 class SearchInterface:
@@ -168,11 +135,8 @@ class SearchInterface:
         """, unsafe_allow_html=True)
 
 # Inicialización de servicios y la interfaz
-duenos_backend = "http://fastapi:8000/duenos"
-animales_backend = "http://fastapi:8000/animales"
-
-dueno_service = DuenoService(duenos_backend)
-animal_service = AnimalService(animales_backend)
+dueno_service = DuenoService()
+animal_service = AnimalService()
 search_interface = SearchInterface(dueno_service, animal_service)
 
 # Mostrar interfaz
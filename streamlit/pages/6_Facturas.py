@@ -1,10 +1,12 @@
 import streamlit as st
-import requests
 from datetime import datetime
 import os
 import pandas as pd
 import time
 
+import cliente_api
+from cliente_api import AnimalService, DuenoService
+
 
 
 
@@ -27,40 +29,6 @@ class FacturaRepository:
             df = nuevo_registro
         df.to_csv(self.filename, index=False)
 
-# Clase para manejar la lógica de los dueños
-class DuenoService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def obtener_duenos(self):
-        try:
-            response = requests.get(self.backend_url)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                st.error(f"Error al obtener dueños: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            st.error(f"Error al obtener dueños: {e}")
-            return []
-
-# Clase para manejar la lógica de los animales
-class AnimalService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def obtener_animales(self):
-        try:
-            response = requests.get(self.backend_url)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                st.error(f"Error al obtener animales: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            st.error(f"Error al obtener animales: {e}")
-            return []
-
 # Clase para manejar la lógica de la factura
 class Factura:
     def __init__(self, nombre_dueno, nombre_animal, tratamiento, precio_sin_iva):
@@ -171,8 +139,12 @@ class Factura:
                 "fecha": self.fecha.strftime('%Y-%m-%d %H:%M:%S')
             }
             
-            response = requests.post("http://fastapi:8000/alta_factura/", json=factura_data)
-            
+            try:
+                response = cliente_api.post("/alta_factura/", factura_data)
+            except Exception as e:
+                st.error(f"❌ Error al guardar la factura: {e}")
+                return
+
             if response.status_code == 200:
                 repository.add(factura_data)
             else:
@@ -290,13 +262,9 @@ class Consulta:
                         st.error("❌ Por favor, completa todos los campos.")
 
 def main():
-    # URL del microservicio FastAPI
-    animales_backend = "http://fastapi:8000/animales"
-    duenos_backend = "http://fastapi:8000/duenos"
-
     # Crear instancias de los servicios
-    dueno_service = DuenoService(duenos_backend)
-    animal_service = AnimalService(animales_backend)
+    dueno_service = DuenoService()
+    animal_service = AnimalService()
 
     # Crear instancia del repositorio de facturas
     factura_repository = FacturaRepository("registroFacturas.csv")
@@ -1,63 +1,9 @@
-import requests
 import streamlit as st
 from streamlit_calendar import calendar
 import time
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-# Clase para manejar la lógica de las citas
-class CitaService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def send(self, data, method="POST", cita_id=None):
-        try:
-            url = self.backend_url if cita_id is None else f"{self.backend_url}/{cita_id}"
-            if method == "POST":
-                response = requests.post(url, json=data)
-            elif method == "PUT":
-                response = requests.put(url, json=data)
-            elif method == "DELETE":
-                response = requests.delete(url)
-            if response.status_code == 200:
-                return response.json() if method == "POST" else '200'
-            else:
-                return str(response.status_code)
-        except Exception as e:
-            return str(e)
-
-# Clase para manejar la lógica de los dueños
-class DuenoService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def get_duenos(self):
-        try:
-            response = requests.get(self.backend_url)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                st.error(f"Error al obtener dueños: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            st.error(f"Excepción al obtener dueños: {e}")
-            return []
-
-# Clase para manejar la lógica de los animales
-class AnimalService:
-    def __init__(self, backend_url):
-        self.backend_url = backend_url
-
-    def get_animales(self):
-        try:
-            response = requests.get(self.backend_url)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                st.error(f"Error al obtener animales: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            st.error(f"Excepción al obtener animales: {e}")
-            return []
+from cliente_api import AnimalService, CitaService, DuenoService
 
 # Clase para manejar la interfaz de usuario
 class CitaInterface:
@@ -92,14 +38,21 @@ class CitaInterface:
             </style>
         """, unsafe_allow_html=True)
 
+        # Rango visible elegido en la página: el componente no informa de la
+        # navegación, así que día/semana y fecha se controlan desde aquí y solo
+        # se piden al servidor las citas de ese rango
+        vista, desde, hasta = self.rango_visible()
+
         # Configuración del calendario
         calendar_options = {
             "headerToolbar": {
-                "left": "prev,next today",
+                "left": "",
                 "center": "title",
-                "right": "resourceTimeGridDay,resourceTimeGridWeek"
+                "right": ""
             },
-            "initialView": "resourceTimeGridDay",
+            "initialView": vista,
+            "initialDate": desde.isoformat(),
+            "firstDay": 1,
             "slotMinTime": "08:00:00",
             "slotMaxTime": "18:00:00",
             "slotDuration": "00:30:00",
@@ -123,7 +76,8 @@ class CitaInterface:
         # Renderizar calendario
         with st.container():
             st.markdown('<div class="calendar-container">', unsafe_allow_html=True)
-            state = calendar(events=st.session_state.get("events", []), options=calendar_options)
+            state = calendar(events=self.eventos(desde, hasta), options=calendar_options,
+                             key=f"calendario_{vista}_{desde.isoformat()}")
             st.markdown('</div>', unsafe_allow_html=True)
 
             # Procesar selección de horario
@@ -136,6 +90,22 @@ class CitaInterface:
             if state.get("eventClick"):
                 self.mostrar_detalles_cita(state["eventClick"]["event"])
 
+    def rango_visible(self):
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            vista = st.radio("Vista", ["Día", "Semana"], horizontal=True)
+        with col2:
+            dia = st.date_input("Fecha", value=date.today())
+        if vista == "Semana":
+            desde = dia - timedelta(days=dia.weekday())  # Lunes
+            return "resourceTimeGridWeek", desde, desde + timedelta(days=7)
+        return "resourceTimeGridDay", dia, dia + timedelta(days=1)
+
+    def eventos(self, desde, hasta):
+        citas = self.cita_service.en_rango(datetime.combine(desde, datetime.min.time()).isoformat(),
+                                           datetime.combine(hasta, datetime.min.time()).isoformat())
+        return [a_evento(cita) for cita in citas if cita]
+
     def registrar_cita(self):
         with st.form("form_cita", clear_on_submit=True):
             col1, col2 = st.columns(2)
@@ -170,13 +140,13 @@ class CitaInterface:
         self.crear_cita(nombre_animal, nombre_dueno, tratamiento, hora_inicio, hora_fin, consulta)
 
     def get_animales_nombres(self):
-        animales = self.animal_service.get_animales()
+        animales = self.animal_service.obtener_animales()
         if not animales:
             return ["No hay animales registrados."]
         return [animal["nombre_animal"] for animal in animales]
 
     def get_duenos_nombres(self):
-        duenos = self.dueno_service.get_duenos()
+        duenos = self.dueno_service.obtener_duenos()
         if not duenos:
             return ["No hay dueños registrados."]
         return [dueno["nombre_dueno"] for dueno in duenos]
@@ -191,25 +161,14 @@ class CitaInterface:
         ]
 
     def verificar_disponibilidad(self, hora_inicio, hora_fin):
-        consulta_a_ocupada = False
-        consulta_b_ocupada = False
-        
-        for event in st.session_state["events"]:
-            tiempo_conflicto = (
-                event["start"] <= hora_inicio < event["end"] or
-                event["start"] < hora_fin <= event["end"]
-            )
-            if tiempo_conflicto:
-                if event["resourceId"] == "A":
-                    consulta_a_ocupada = True
-                elif event["resourceId"] == "B":
-                    consulta_b_ocupada = True
-
-        if consulta_a_ocupada and consulta_b_ocupada:
+        libres = self.cita_service.disponibilidad(hora_inicio, hora_fin)
+        if libres is None:
+            return None
+        if not libres:
             st.error("❌ Ambas consultas están ocupadas en este horario")
             return None
         
-        return "B" if consulta_a_ocupada else "A"
+        return libres[0]
 
     def crear_cita(self, nombre_animal, nombre_dueno, tratamiento, hora_inicio, hora_fin, consulta):
         data = {
@@ -223,21 +182,13 @@ class CitaInterface:
         
         response = self.cita_service.send(data)
         if isinstance(response, dict) and "id" in response:
-            color = "#FFA500" if consulta == "B" else "#FF4444"  # Naranja para B, Rojo para A
-            nuevo_evento = {
-                "id": response["id"],
-                "title": tratamiento,
-                "start": hora_inicio,
-                "end": hora_fin,
-                "backgroundColor": color,
-                "borderColor": color,
-                "resourceId": consulta,
-                "className": f"consultation-{consulta.lower()}"
-            }
-            st.session_state["events"].append(nuevo_evento)
+            # El alta vacía la caché de lecturas: al recargar se ve la cita nueva
             st.success("✅ Cita registrada con éxito!")
             time.sleep(1)
             st.rerun()
+        elif response == '409':
+            # Otra recepción ha reservado el hueco entre la comprobación y el alta
+            st.error("❌ La consulta se acaba de ocupar en este horario, elige otro hueco")
         else:
             st.error("❌ Error al registrar la cita")
 
@@ -333,21 +284,6 @@ class CitaInterface:
         
         response = self.cita_service.send(data, method="PUT", cita_id=cita_id)
         if response == '200':
-            # Actualizar el evento en el estado local
-            for event in st.session_state["events"]:
-                if event["id"] == cita_id:
-                    color = "#FFA500" if consulta == "B" else "#FF4444"
-                    event.update({
-                        "title": tratamiento,
-                        "nombre_animal": nombre_animal,
-                        "nombre_dueno": nombre_dueno,
-                        "start": hora_inicio,
-                        "end": hora_fin,
-                        "backgroundColor": color,
-                        "borderColor": color,
-                        "resourceId": consulta,
-                        "className": f"consultation-{consulta.lower()}"
-                    })
             st.success("✅ Cita actualizada con éxito!")
             time.sleep(1)
             st.rerun()
@@ -358,11 +294,6 @@ class CitaInterface:
         try:
             response = self.cita_service.send(None, method="DELETE", cita_id=cita_id)
             if response == '200':
-                # Eliminar el evento del estado local
-                st.session_state["events"] = [
-                    event for event in st.session_state["events"] 
-                    if event["id"] != cita_id
-                ]
                 st.success("✅ Cita cancelada con éxito!")
                 time.sleep(1)
                 st.rerun()
@@ -403,18 +334,25 @@ class CitaInterface:
             </div>
         """, unsafe_allow_html=True)
 
-# Inicialización
-if "events" not in st.session_state:
-    st.session_state["events"] = []
-
-citas_backend = "http://fastapi:8000/citas"
-duenos_backend = "http://fastapi:8000/duenos"
-animales_backend = "http://fastapi:8000/animales"
+def a_evento(cita):
+    # Cita del servidor -> evento de FullCalendar. El almacén CSV guarda las
+    # fechas como "AAAA-MM-DD HH:MM:SS"; FullCalendar espera ISO 8601 con "T"
+    consulta = cita.get("consulta") or "A"
+    color = "#FFA500" if consulta == "B" else "#FF4444"  # Naranja para B, Rojo para A
+    return {
+        "id": cita["id"],
+        "title": cita["tratamiento"],
+        "start": str(cita["fecha_inicio"]).replace(" ", "T", 1),
+        "end": str(cita["fecha_fin"]).replace(" ", "T", 1),
+        "backgroundColor": color,
+        "borderColor": color,
+        "resourceId": consulta,
+        "className": f"consultation-{consulta.lower()}",
+        "extendedProps": {"nombre_animal": cita.get("nombre_animal"),
+                          "nombre_dueno": cita.get("nombre_dueno")}
+    }
 
-cita_interface = CitaInterface(
-    CitaService(citas_backend),
-    DuenoService(duenos_backend),
-    AnimalService(animales_backend)
-)
+# Inicialización
+cita_interface = CitaInterface(CitaService(), DuenoService(), AnimalService())
 
 cita_interface.mostrar_calendario()
\ No newline at end of file